@@ -1,22 +1,51 @@
+import codecs
 import json
+import mmap
 import os
+import re
+import secrets
+import stat
+import tempfile
+import threading
+import time
+import weakref
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from itertools import islice
+
+try:
+    import fcntl
+except ImportError:  # Windows: shared TodoLists are unavailable
+    fcntl = None
 
 
 # =============================================================================
 # EXERCISE 3.1: Writing to a File
 # =============================================================================
-def write_lines(filepath: str, lines: list) -> None:
+def write_lines(filepath: str, lines, batch_size: int = 1024) -> None:
+    # Accepts any iterable; lines are joined and written batch_size at a time
+    lines = iter(lines)
     with open(filepath, "w", encoding="utf-8") as f:
-        for line in lines:
-            f.write(line + "\n")
+        while True:
+            batch = list(islice(lines, batch_size))
+            if not batch:
+                break
+            f.write("\n".join(batch) + "\n")
 
 
 # =============================================================================
 # EXERCISE 3.2: Reading from a File
 # =============================================================================
 def read_lines(filepath: str) -> list:
+    return list(iter_lines(filepath))
+
+
+def iter_lines(filepath: str):
     with open(filepath, "r", encoding="utf-8") as f:
-        return [line.strip() for line in f]
+        for line in f:
+            yield line.strip()
 
 
 # =============================================================================
@@ -27,20 +56,267 @@ def append_line(filepath: str, line: str) -> None:
         f.write(line + "\n")
 
 
+def _close_abandoned(f, buffer: list, lock, write_lock, durable: bool) -> None:
+    # Runs when an Appender is garbage-collected without close(), or at
+    # interpreter exit while it is still open: writes what is buffered.
+    # It holds the file and buffer, never the Appender itself.
+    with write_lock:
+        with lock:
+            batch = "".join(buffer)
+            buffer.clear()
+        if f.closed:
+            return
+        if batch:
+            f.write(batch)
+            f.flush()
+            if durable:
+                os.fsync(f.fileno())
+        f.close()
+
+
+def _flush_periodically(ref, stop: threading.Event, interval: float) -> None:
+    # Holds only a weak reference, so an abandoned Appender can still be
+    # collected; the thread exits with it.
+    while not stop.wait(interval):
+        appender = ref()
+        if appender is None:
+            return
+        appender.flush()
+        del appender
+
+
+class Appender:
+    # Keeps the file open and buffers lines. The buffer is written as one
+    # batch once it holds max_lines lines or max_bytes UTF-8 bytes, every
+    # flush_interval milliseconds (by a background thread, and on the first
+    # append that finds the interval elapsed), on flush()/close(), and when
+    # an unclosed Appender is collected or the interpreter exits.
+    # Appending threads only hold the buffer lock; the thread that flushes
+    # takes the buffered lines out and writes (and, when durable, fsyncs)
+    # them under a separate write lock, so others keep appending meanwhile
+    # and whole batches land in order.
+    def __init__(self, filepath: str, max_lines: int = 1000, max_bytes: int = 1 << 16,
+                 flush_interval: float = None, durable: bool = False):
+        self.filepath = filepath
+        self.max_lines = max_lines
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.durable = durable
+        self._file = open(filepath, "a", encoding="utf-8")
+        self._buffer = []
+        self._size = 0
+        self._flushed_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._finalizer = weakref.finalize(self, _close_abandoned, self._file, self._buffer,
+                                           self._lock, self._write_lock, durable)
+        if flush_interval is not None:
+            threading.Thread(target=_flush_periodically, daemon=True,
+                             args=(weakref.ref(self), self._stop, flush_interval / 1000)).start()
+
+    def __enter__(self) -> "Appender":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def append(self, line: str) -> None:
+        line += "\n"
+        with self._lock:
+            if self._file is None:
+                raise ValueError("Appender is closed")
+            self._buffer.append(line)
+            self._size += len(line) if line.isascii() else len(line.encode("utf-8"))
+            due = (len(self._buffer) >= self.max_lines or self._size >= self.max_bytes
+                   or (self.flush_interval is not None
+                       and (time.monotonic() - self._flushed_at) * 1000 >= self.flush_interval))
+        if due:
+            self.flush()
+
+    def flush(self) -> None:
+        self._drain(close=False)
+
+    def close(self) -> None:
+        self._stop.set()
+        self._drain(close=True)
+        self._finalizer.detach()
+
+    def _drain(self, close: bool) -> None:
+        with self._write_lock:
+            with self._lock:
+                # Emptied in place: the finalizer holds this same list
+                batch = self._buffer.copy()
+                self._buffer.clear()
+                self._size = 0
+                self._flushed_at = time.monotonic()
+                f = self._file
+                if close:
+                    self._file = None
+            if f is None:
+                return
+            if batch:
+                f.write("".join(batch))
+                f.flush()
+                if self.durable:
+                    os.fsync(f.fileno())
+            if close:
+                f.close()
+
+
 # =============================================================================
 # EXERCISE 3.4: Count Words in a File
 # =============================================================================
-def count_words(filepath: str) -> int:
+def count_words(filepath: str, chunk_size: int = 1 << 20, frequencies: bool = False):
+    # Returns the number of words, or a Counter of them with frequencies=True
     with open(filepath, "r", encoding="utf-8") as f:
-        text = f.read()
-    return len(text.split())
+        return _count_chunks(iter(partial(f.read, chunk_size), ""), frequencies)
+
+
+def _count_chunks(chunks, frequencies: bool = False):
+    # A word split across two chunks is counted in both, so one is taken
+    # off when a chunk continues the previous chunk's last word. Only for
+    # frequencies is the word itself needed: its pieces are collected and
+    # joined once, when it ends.
+    count = 0
+    in_word = False
+    counter = Counter()
+    pieces = []
+    for chunk in chunks:
+        if not chunk:
+            continue
+        words = chunk.split()
+        count += len(words)
+        continues = in_word and not chunk[0].isspace()
+        if continues:
+            count -= 1
+        in_word = not chunk[-1].isspace()
+        if frequencies:
+            if continues:
+                pieces.append(words[0])
+                del words[0]
+                if words or not in_word:
+                    counter["".join(pieces)] += 1
+                    pieces = []
+            elif pieces:
+                counter["".join(pieces)] += 1
+                pieces = []
+            if in_word and words:
+                pieces.append(words.pop())
+            counter.update(words)
+        del chunk, words  # keep one chunk alive at a time
+    if pieces:
+        counter["".join(pieces)] += 1
+    return counter if frequencies else count
+
+
+# Split points are ASCII whitespace bytes, which never occur inside a UTF-8
+# sequence or a word, so every range decodes on its own and the per-range
+# counts add up to exactly the count_words() result.
+_WHITESPACE_BYTE = re.compile(rb"[ \t\n\r\x0b\x0c]")
+
+
+def _split_ranges(data, parts: int) -> list:
+    size = len(data)
+    points = [0]
+    for i in range(1, parts):
+        match = _WHITESPACE_BYTE.search(data, max(size * i // parts, points[-1]))
+        points.append(match.start() if match else size)
+    points.append(size)
+    return [(start, end) for start, end in zip(points, points[1:]) if start < end]
+
+
+def _count_range(filepath: str, start: int, end: int, chunk_size: int, frequencies: bool):
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    with open(filepath, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        chunks = (decoder.decode(data[pos:min(pos + chunk_size, end)], final=pos + chunk_size >= end)
+                  for pos in range(start, end, chunk_size))
+        return _count_chunks(chunks, frequencies)
+
+
+def count_words_parallel(filepath: str, workers: int = None, chunk_size: int = 1 << 20,
+                         frequencies: bool = False):
+    workers = workers or os.cpu_count() or 1
+    if os.path.getsize(filepath) == 0:
+        return Counter() if frequencies else 0
+    with open(filepath, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        ranges = _split_ranges(data, workers)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(_count_range, *zip(*[(filepath, start, end, chunk_size, frequencies)
+                                                  for start, end in ranges]))
+        if not frequencies:
+            return sum(results)
+        total = Counter()
+        for counter in results:
+            total.update(counter)
+        return total
 
 
 # =============================================================================
 # EXERCISE 3.5: Write Dictionary to JSON File
 # =============================================================================
+@contextmanager
+def atomic_write(filepath: str, durable: bool = True):
+    # Readers see either the old file or the complete new one, never a
+    # truncated write: the data goes to a temp file in the same directory,
+    # is fsynced, and is renamed over the target.
+    directory = os.path.dirname(os.path.abspath(filepath))
+    f, tmp_path = create_temp_file(filepath)
+    try:
+        with f:
+            yield f
+            f.flush()
+            if durable:
+                os.fsync(f.fileno())
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if durable:
+        sync_directory(directory)
+
+
+def create_temp_file(filepath: str, binary: bool = False) -> tuple:
+    # A uniquely named temp file next to filepath, opened for writing, with
+    # the permissions filepath has (or would get from open()) rather than
+    # mkstemp's 0600, so renaming it over filepath keeps the file's mode.
+    # Creating it with mode 0666 lets the kernel apply the umask.
+    directory = os.path.dirname(os.path.abspath(filepath))
+    for _ in range(tempfile.TMP_MAX):
+        tmp_path = os.path.join(directory, f".tmp-{secrets.token_hex(4)}{os.path.basename(filepath)}")
+        try:
+            fd = os.open(tmp_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666)
+            break
+        except FileExistsError:
+            continue
+    else:
+        raise FileExistsError(f"No unused temp file name next to {filepath}")
+    try:
+        try:
+            os.fchmod(fd, stat.S_IMODE(os.stat(filepath).st_mode))
+        except FileNotFoundError:
+            pass
+        f = os.fdopen(fd, "wb") if binary else os.fdopen(fd, "w", encoding="utf-8")
+    except BaseException:
+        os.close(fd)
+        os.remove(tmp_path)
+        raise
+    return f, tmp_path
+
+
+def sync_directory(directory: str) -> None:
+    if not hasattr(os, "O_DIRECTORY"):
+        return  # directories cannot be opened for fsync on Windows
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
 def save_json(filepath: str, data: dict) -> None:
-    with open(filepath, "w", encoding="utf-8") as f:
+    with atomic_write(filepath) as f:
         json.dump(data, f, indent=2)
 
 
@@ -64,39 +340,187 @@ def update_json(filepath: str, **updates) -> None:
 # =============================================================================
 # EXERCISE 3.8: Todo List Manager
 # =============================================================================
+class VersionConflict(Exception):
+    pass
+
+
 class TodoList:
-    def __init__(self, filepath: str):
+    def __init__(self, filepath: str, journal: bool = False, compact_every: int = 1000,
+                 shared: bool = False):
+        if shared and journal:
+            raise ValueError("A shared TodoList cannot use the journal")
+        if shared and fcntl is None:
+            raise ValueError("A shared TodoList requires fcntl")
         self.filepath = filepath
+        self.journal = journal
+        self.journal_file = filepath + ".log"
+        self.compact_every = compact_every
+        self._journal_entries = 0
+        self.shared = shared
+        self.lock_file = filepath + ".lock"
+        self.version = None
+        self.todos = []
+        self._by_id = {}
+        self._pending = {}
+        self._high_water = 0
+        if shared:
+            self.refresh()
+            return
         try:
-            self.todos = load_json(filepath)
+            todos = load_json(filepath)
         except FileNotFoundError:
-            self.todos = []
+            todos = []
+        for todo in todos:
+            self._put(todo)
+        if journal:
+            self._replay_journal()
+
+    def _put(self, todo: dict) -> None:
+        self.todos.append(todo)
+        self._by_id[todo["id"]] = todo
+        if not todo["done"]:
+            self._pending[todo["id"]] = todo
+        self._high_water = max(self._high_water, todo["id"])
+
+    def _mark_done(self, todo: dict) -> None:
+        todo["done"] = True
+        self._pending.pop(todo["id"], None)
 
     def _save(self) -> None:
         save_json(self.filepath, self.todos)
 
-    def _next_id(self) -> int:
-        if not self.todos:
-            return 1
-        return max(todo["id"] for todo in self.todos) + 1
-
-    def add(self, task: str) -> int:
-        todo_id = self._next_id()
-        new_todo = {"id": todo_id, "task": task, "done": False}
-        self.todos.append(new_todo)
+    # Journal mode appends one JSON line per add/complete instead of
+    # rewriting the list; every compact_every events the list is saved and
+    # the log truncated. Replay is idempotent, so a crash between the two
+    # steps of compact() is harmless.
+    def _replay_journal(self) -> None:
+        try:
+            with open(self.journal_file, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except json.JSONDecodeError:
+                        break  # torn write at the tail of the log
+                    self._apply(event)
+                    self._journal_entries += 1
+        except FileNotFoundError:
+            pass
+
+    def _apply(self, event: dict) -> None:
+        todo = self._by_id.get(event["id"])
+        if event["op"] == "add":
+            if todo is None:
+                self._put({"id": event["id"], "task": event["task"], "done": False})
+        elif event["op"] == "complete":
+            if todo is not None:
+                self._mark_done(todo)
+        else:
+            raise ValueError(f"Unknown journal operation: {event['op']}")
+
+    def _record(self, event: dict) -> None:
+        if not self.journal:
+            self._save()
+            return
+        with open(self.journal_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps(event) + "\n")
+        self._journal_entries += 1
+        if self._journal_entries >= self.compact_every:
+            self.compact()
+
+    def compact(self) -> None:
         self._save()
-        return todo_id
+        with open(self.journal_file, "w", encoding="utf-8"):
+            pass
+        self._journal_entries = 0
+
+    # Shared mode lets several processes use one file. The lock file holds
+    # the version, bumped on every write, and is flock()ed: shared to read,
+    # exclusive to write. Each add/complete locks, re-reads the list if the
+    # version moved and merges it by id, applies the change and saves. The
+    # version is bumped before the list is replaced, so a crash in between
+    # only causes a needless re-read. Passing expected_version makes the
+    # change optimistic: it fails with VersionConflict if another process
+    # wrote since, so no lock is held while the caller works.
+    @contextmanager
+    def _locked(self, exclusive: bool):
+        with open(self.lock_file, "a+", encoding="utf-8") as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                f.seek(0)
+                yield f
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _disk_version(self, lock) -> int:
+        text = lock.read().strip()
+        return int(text) if text else 0
+
+    def _sync(self, version: int) -> None:
+        if version == self.version:
+            return
+        try:
+            todos = load_json(self.filepath)
+        except FileNotFoundError:
+            todos = []
+        for todo in todos:
+            existing = self._by_id.get(todo["id"])
+            if existing is None:
+                self._put(todo)
+            else:
+                existing.update(todo)
+                if existing["done"]:
+                    self._pending.pop(existing["id"], None)
+        self.version = version
 
-    def complete(self, todo_id: int) -> bool:
-        for todo in self.todos:
-            if todo["id"] == todo_id:
-                todo["done"] = True
+    def refresh(self) -> None:
+        with self._locked(exclusive=False) as lock:
+            self._sync(self._disk_version(lock))
+
+    def _change(self, change, expected_version: int = None):
+        # change() applies an operation in memory and returns its result and
+        # the event to persist, or None when nothing changed
+        if not self.shared:
+            result, event = change()
+            if event is not None:
+                self._record(event)
+            return result
+        with self._locked(exclusive=True) as lock:
+            version = self._disk_version(lock)
+            if expected_version is not None and version != expected_version:
+                raise VersionConflict(f"{self.filepath} changed since version {expected_version}")
+            self._sync(version)
+            result, event = change()
+            if event is not None:
+                self.version += 1
+                lock.truncate(0)
+                lock.write(str(self.version))
+                lock.flush()
                 self._save()
-                return True
-        return False
+        return result
+
+    def _next_id(self) -> int:
+        return self._high_water + 1
+
+    def add(self, task: str, expected_version: int = None) -> int:
+        def change():
+            todo_id = self._next_id()
+            self._put({"id": todo_id, "task": task, "done": False})
+            return todo_id, {"op": "add", "id": todo_id, "task": task}
+        return self._change(change, expected_version)
+
+    def complete(self, todo_id: int, expected_version: int = None) -> bool:
+        def change():
+            todo = self._by_id.get(todo_id)
+            if todo is None:
+                return False, None
+            if todo["done"]:
+                return True, None
+            self._mark_done(todo)
+            return True, {"op": "complete", "id": todo_id}
+        return self._change(change, expected_version)
 
     def get_pending(self) -> list:
-        return [todo for todo in self.todos if not todo["done"]]
+        return list(self._pending.values())
 
     def get_all(self) -> list:
-        return self.todos
\ No newline at end of file
+        return self.todos
@@ -1,6 +1,36 @@
+import asyncio
+import bisect
+import heapq
+import inspect
 import json
+import logging
+import math
+import multiprocessing
+import operator
 import os
-from datetime import datetime
+import re
+import sqlite3
+import struct
+import sys
+import threading
+import time
+import weakref
+import zlib
+from array import array
+from collections import Counter, OrderedDict
+from collections.abc import Mapping, MutableMapping
+from contextlib import contextmanager, nullcontext
+from datetime import date, datetime, timedelta
+from itertools import compress, count
+
+try:
+    import numpy
+except ImportError:  # optional: CatalogColumns falls back to the array module
+    numpy = None
+
+from .files import atomic_write, create_temp_file, sync_directory
+
+logger = logging.getLogger(__name__)
 
 
 # =============================================================================
@@ -23,26 +53,114 @@ def generate_id(prefix: str, existing_ids: list) -> str:
     return f"{prefix}_{next_num:04d}"
 
 
-def search_items(items: list, **criteria) -> list:
-    results = []
-    for item in items:
-        match = True
+class IdAllocator:
+    def __init__(self, prefix: str, existing_ids: list = ()):
+        self.prefix = prefix
+        self.high_water = 0
+        for item_id in existing_ids:
+            self.observe(item_id)
+
+    def observe(self, item_id: str) -> None:
+        head, _, number = item_id.partition("_")
+        if head == self.prefix and number.isdigit():
+            self.high_water = max(self.high_water, int(number))
+
+    def peek(self) -> str:
+        return f"{self.prefix}_{self.high_water + 1:04d}"
+
+    def allocate(self) -> str:
+        self.high_water += 1
+        return f"{self.prefix}_{self.high_water:04d}"
+
+
+QUERY_OPERATORS = ("eq", "ne", "in", "not_in", "lt", "lte", "gt", "gte")
+
+
+_COMPARISONS = {"lt": operator.lt, "lte": operator.le, "gt": operator.gt, "gte": operator.ge}
+
+
+def _split_criterion(key: str) -> tuple:
+    field, _, op = key.rpartition("__")
+    if field and op in QUERY_OPERATORS:
+        return field, op
+    return key, "eq"
+
+
+def _fold(value):
+    return value.lower() if isinstance(value, str) else value
+
+
+def _compile_check(op: str, value):
+    if op in ("eq", "ne"):
+        if isinstance(value, str):
+            target = value.lower()
+            def check(v):
+                return v.lower() == target if isinstance(v, str) else v == value
+        else:
+            def check(v):
+                return v == value
+    elif op in ("in", "not_in"):
+        folded = [_fold(v) for v in value]
+        try:
+            folded = frozenset(folded)
+        except TypeError:
+            pass  # unhashable members: fall back to a linear membership test
+        def check(v):
+            return _fold(v) in folded
+    else:
+        target = _fold(value)
+        compare = _COMPARISONS[op]
+        def check(v):
+            try:
+                return compare(_fold(v), target)
+            except TypeError:
+                return False
+    if op in ("ne", "not_in"):
+        return lambda v: not check(v)
+    return check
+
+
+class Query:
+    def __init__(self, **criteria):
+        # __in/__not_in values are kept as a tuple: the criteria are read
+        # again by index lookups and SQL, so a generator must not be used up
+        self.criteria = {}
+        self._checks = []
         for key, value in criteria.items():
-            if key not in item:
-                match = False
-                break
-            item_val = item[key]
-            if isinstance(item_val, str) and isinstance(value, str):
-                if item_val.lower() != value.lower():
-                    match = False
-                    break
-            else:
-                if item_val != value:
-                    match = False
-                    break
-        if match:
-            results.append(item)
-    return results
+            field, op = _split_criterion(key)
+            if op in ("in", "not_in"):
+                if isinstance(value, (str, bytes)):
+                    raise TypeError(f"{key} expects a collection of values, not a string")
+                value = tuple(value)
+            self.criteria[key] = value
+            self._checks.append((field, _compile_check(op, value)))
+
+    def __call__(self, item: dict) -> bool:
+        for field, check in self._checks:
+            if field not in item or not check(item[field]):
+                return False
+        return True
+
+
+def compile_query(**criteria) -> Query:
+    return Query(**criteria)
+
+
+def _as_query(query, criteria: dict) -> Query:
+    if query is None:
+        return Query(**criteria)
+    if criteria:
+        raise TypeError("Pass either a compiled query or criteria, not both")
+    return query
+
+
+def search_items(items: list, query: Query = None, /, **criteria) -> list:
+    query = _as_query(query, criteria)
+    return [item for item in items if query(item)]
+
+
+def _index_key(value):
+    return value.casefold() if isinstance(value, str) else value
 
 
 # =============================================================================
@@ -50,7 +168,10 @@ def search_items(items: list, **criteria) -> list:
 # =============================================================================
 
 class Book:
+    __slots__ = ("book_id", "title", "author", "genre", "available")
+
     GENRES = ["Fiction", "Non-Fiction", "Science", "History", "Technology"]
+    _CANONICAL_GENRES = {genre: genre for genre in GENRES}
 
     def __init__(self, book_id: str, title: str, author: str, genre: str, available: bool = True):
         if genre not in Book.GENRES:
@@ -58,7 +179,8 @@ class Book:
         self.book_id = book_id
         self.title = title
         self.author = author
-        self.genre = genre
+        # Every book shares one string object per genre
+        self.genre = Book._CANONICAL_GENRES.get(genre, genre)
         self.available = available
 
     def to_dict(self) -> dict:
@@ -90,26 +212,52 @@ class Book:
 # =============================================================================
 
 class Borrower:
+    __slots__ = ("borrower_id", "name", "email", "_loans")
+
     MAX_BOOKS = 3
 
-    def __init__(self, borrower_id: str, name: str, email: str, borrowed_books: list = None):
+    def __init__(self, borrower_id: str, name: str, email: str, borrowed_books: list = None,
+                 checkout_dates: dict = None):
         self.borrower_id = borrower_id
         self.name = name
         self.email = email
-        self.borrowed_books = borrowed_books if borrowed_books else []
+        # Insertion-ordered set of book IDs, mapped to their checkout date
+        self._loans = dict.fromkeys(borrowed_books or ())
+        if checkout_dates:
+            for book_id, date in checkout_dates.items():
+                if book_id in self._loans:
+                    self._loans[book_id] = date
+
+    @property
+    def borrowed_books(self) -> list:
+        return list(self._loans)
+
+    @borrowed_books.setter
+    def borrowed_books(self, book_ids: list) -> None:
+        self._loans = dict.fromkeys(book_ids)
+
+    @property
+    def checkout_dates(self) -> dict:
+        return {book_id: date for book_id, date in self._loans.items() if date is not None}
+
+    def has_book(self, book_id: str) -> bool:
+        return book_id in self._loans
+
+    def get_checkout_date(self, book_id: str):
+        return self._loans.get(book_id)
 
     def can_borrow(self) -> bool:
-        return len(self.borrowed_books) < Borrower.MAX_BOOKS
+        return len(self._loans) < Borrower.MAX_BOOKS
 
-    def borrow_book(self, book_id: str) -> bool:
+    def borrow_book(self, book_id: str, checkout_date: str = None) -> bool:
         if not self.can_borrow():
             return False
-        self.borrowed_books.append(book_id)
+        self._loans[book_id] = checkout_date
         return True
 
     def return_book(self, book_id: str) -> bool:
-        if book_id in self.borrowed_books:
-            self.borrowed_books.remove(book_id)
+        if book_id in self._loans:
+            del self._loans[book_id]
             return True
         return False
 
@@ -118,7 +266,8 @@ class Borrower:
             "borrower_id": self.borrower_id,
             "name": self.name,
             "email": self.email,
-            "borrowed_books": self.borrowed_books
+            "borrowed_books": self.borrowed_books,
+            "checkout_dates": self.checkout_dates
         }
 
     @classmethod
@@ -127,7 +276,8 @@ class Borrower:
             data["borrower_id"],
             data["name"],
             data["email"],
-            data.get("borrowed_books", [])
+            data.get("borrowed_books", []),
+            data.get("checkout_dates")
         )
 
 
@@ -135,79 +285,1228 @@ class Borrower:
 # PART 4: LIBRARY CLASS (Main System)
 # =============================================================================
 
+# Binary snapshots are columnar. The file starts with BINARY_MAGIC and a
+# format version, then the row and field counts, then one column per field:
+# its name, a kind byte and length-prefixed sections. Booleans are packed one
+# per byte, repetitive strings (authors, genres) become a string table plus
+# uint32 codes, other strings are joined with NUL, and anything else (loan
+# lists, checkout dates) is stored as JSON text. All integers are
+# little-endian, so a snapshot reads the same on any machine and any Python
+# version; readers refuse versions they do not know.
+BINARY_MAGIC = b"LIBCOL\n\0"
+BINARY_VERSION = 2
+_HEADER = struct.Struct("<HII")
+_LENGTH = struct.Struct("<I")
+_KINDS = {"bool": 0, "table": 1, "joined": 2, "json": 3}
+
+
+def _joinable(values) -> bool:
+    return not any("\0" in v for v in values)
+
+
+def _codes_bytes(codes: array) -> bytes:
+    if sys.byteorder != "little":
+        codes.byteswap()
+    return codes.tobytes()
+
+
+def _encode_column(values: list) -> tuple:
+    if all(type(v) is bool for v in values):
+        return "bool", [bytes(values)]
+    if all(type(v) is str for v in values):
+        table = {}
+        codes = [table.setdefault(v, len(table)) for v in values]
+        if len(table) * 2 <= len(values) and _joinable(table):
+            return "table", ["\0".join(table).encode("utf-8"), _codes_bytes(array("I", codes))]
+        if _joinable(values):
+            return "joined", ["\0".join(values).encode("utf-8")]
+    return "json", [json.dumps(values).encode("utf-8")]
+
+
+def _decode_column(kind: int, sections: list, rows: int) -> list:
+    if kind == _KINDS["bool"]:
+        values = [b == 1 for b in sections[0]]
+    elif kind == _KINDS["table"]:
+        table = sections[0].decode("utf-8").split("\0")
+        codes = array("I")
+        codes.frombytes(sections[1])
+        if sys.byteorder != "little":
+            codes.byteswap()
+        values = list(map(table.__getitem__, codes))
+    elif kind == _KINDS["joined"]:
+        values = sections[0].decode("utf-8").split("\0") if rows else []
+    elif kind == _KINDS["json"]:
+        values = json.loads(sections[0])
+    else:
+        raise ValueError(f"Unknown column kind {kind}")
+    if len(values) != rows:
+        raise ValueError(f"Column has {len(values)} values, expected {rows}")
+    return values
+
+
+def _encode_columns(records) -> bytes:
+    records = list(records)
+    fields = list(records[0]) if records else []
+    parts = [BINARY_MAGIC, _HEADER.pack(BINARY_VERSION, len(records), len(fields))]
+    for field in fields:
+        kind, sections = _encode_column([r[field] for r in records])
+        name = field.encode("utf-8")
+        parts += [_LENGTH.pack(len(name)), name, bytes((_KINDS[kind], len(sections)))]
+        for section in sections:
+            parts += [_LENGTH.pack(len(section)), section]
+    return b"".join(parts)
+
+
+def _read_columns(path: str) -> tuple:
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data.startswith(BINARY_MAGIC):
+        raise ValueError(f"Not a binary library snapshot: {path}")
+    view = memoryview(data)
+    offset = len(BINARY_MAGIC)
+
+    def take(size: int) -> memoryview:
+        nonlocal offset
+        if offset + size > len(view):
+            raise ValueError(f"Truncated binary library snapshot: {path}")
+        chunk = view[offset:offset + size]
+        offset += size
+        return chunk
+
+    version, rows, field_count = _HEADER.unpack(take(_HEADER.size))
+    if version != BINARY_VERSION:
+        raise ValueError(f"Unsupported binary snapshot version {version}: {path}")
+    fields, columns = [], []
+    for _ in range(field_count):
+        fields.append(str(take(_LENGTH.unpack(take(_LENGTH.size))[0]), "utf-8"))
+        kind, section_count = take(2)
+        sections = [bytes(take(_LENGTH.unpack(take(_LENGTH.size))[0])) for _ in range(section_count)]
+        columns.append(_decode_column(kind, sections, rows))
+    if offset != len(view):
+        raise ValueError(f"Trailing data in binary library snapshot: {path}")
+    return fields, columns
+
+
+def _read_records(path: str, storage: str):
+    if storage == "binary":
+        fields, columns = _read_columns(path)
+        for row in zip(*columns):
+            yield dict(zip(fields, row))
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        if storage == "jsonl":
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from json.load(f)
+
+
+def _stage_records(path: str, storage: str, records, durable: bool = True) -> str:
+    f, tmp_path = create_temp_file(path, binary=storage == "binary")
+    try:
+        with f:
+            if storage == "binary":
+                f.write(_encode_columns(records))
+            elif storage == "jsonl":
+                for record in records:
+                    f.write(json.dumps(record) + "\n")
+            else:
+                json.dump(list(records), f, indent=2)
+            f.flush()
+            if durable:
+                os.fsync(f.fileno())
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return tmp_path
+
+
+def _ingest_records(records, fields: tuple, add, persist) -> dict:
+    started = time.perf_counter()
+    added = 0
+    errors = []
+    for position, record in enumerate(records):
+        try:
+            if isinstance(record, dict):
+                values = [record[field] for field in fields]
+            else:
+                values = list(record)
+            if len(values) != len(fields):
+                raise ValueError(f"Expected {len(fields)} fields, got {len(values)}")
+            add(*values)
+        except KeyError as e:
+            errors.append((position, f"Missing field: {e.args[0]}"))
+        except (TypeError, ValueError) as e:
+            errors.append((position, str(e)))
+        else:
+            added += 1
+    if added:
+        persist()
+    seconds = time.perf_counter() - started
+    return {
+        "added": added,
+        "rejected": len(errors),
+        "errors": errors,
+        "seconds": seconds,
+        "records_per_second": added / seconds if seconds else 0.0
+    }
+
+
+class _LockTable:
+    def __init__(self, enabled: bool):
+        self._locks = {} if enabled else None
+
+    def __call__(self, key: str):
+        if self._locks is None:
+            return nullcontext()
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks.setdefault(key, threading.Lock())
+        return lock
+
+
+class _LazyBooks(MutableMapping):
+    # Books stay on disk until first accessed. The offset index (loaded on
+    # demand) maps each book_id to the byte range of its JSON line.
+    def __init__(self, path: str, count: int, read_offsets):
+        self._path = path
+        self._count = count
+        self._read_offsets = read_offsets
+        self._offsets = None
+        self._cache = {}
+        self._added = {}
+
+    def _index(self) -> dict:
+        if self._offsets is None:
+            self._offsets = self._read_offsets()
+        return self._offsets
+
+    def __getitem__(self, book_id: str) -> Book:
+        book = self._cache.get(book_id)
+        if book is None:
+            offset, length = self._index()[book_id]
+            with open(self._path, "rb") as f:
+                f.seek(offset)
+                book = Book.from_dict(json.loads(f.read(length)))
+            self._cache[book_id] = book
+        return book
+
+    def __contains__(self, book_id) -> bool:
+        return book_id in self._cache or book_id in self._index()
+
+    def __setitem__(self, book_id: str, book: Book) -> None:
+        if book_id not in self:
+            self._added[book_id] = None
+        self._cache[book_id] = book
+
+    def __delitem__(self, book_id: str) -> None:
+        raise TypeError("Books cannot be removed from a library")
+
+    def __iter__(self):
+        yield from list(self._index())
+        yield from list(self._added)
+
+    def __len__(self) -> int:
+        indexed = self._count if self._offsets is None else len(self._offsets)
+        return indexed + len(self._added)
+
+    def records(self):
+        # Unmaterialized books are copied from the current file as parsed
+        # records, without building Book objects.
+        with open(self._path, "rb") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    book = self._cache.get(record["book_id"])
+                    yield record if book is None else book.to_dict()
+        for book_id in self._added:
+            yield self._cache[book_id].to_dict()
+
+    def reindexed(self, count: int) -> None:
+        self._count = count
+        self._offsets = None
+        self._added = {}
+
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def _tokenize(text: str) -> list:
+    return [token.casefold() for token in _TOKEN_PATTERN.findall(text)]
+
+
+class FullTextIndex:
+    # Okapi BM25 parameters
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self):
+        self.postings = {}
+        self.doc_lengths = {}
+        self._total_length = 0
+        self._terms = []
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def add(self, doc_id: str, text: str) -> None:
+        if doc_id in self.doc_lengths:
+            return
+        tokens = _tokenize(text)
+        for token in tokens:
+            posting = self.postings.get(token)
+            if posting is None:
+                posting = self.postings[token] = {}
+                bisect.insort(self._terms, token)
+            posting[doc_id] = posting.get(doc_id, 0) + 1
+        self.doc_lengths[doc_id] = len(tokens)
+        self._total_length += len(tokens)
+
+    def _expand(self, term: str, prefix: bool) -> list:
+        if not prefix:
+            return [term] if term in self.postings else []
+        start = bisect.bisect_left(self._terms, term)
+        end = start
+        while end < len(self._terms) and self._terms[end].startswith(term):
+            end += 1
+        return self._terms[start:end]
+
+    def search(self, query: str, limit: int = 10, prefix: bool = True) -> list:
+        if not self.doc_lengths:
+            return []
+        doc_count = len(self.doc_lengths)
+        average_length = self._total_length / doc_count or 1
+        scores = {}
+        for term in _tokenize(query):
+            for match in self._expand(term, prefix):
+                posting = self.postings[match]
+                idf = math.log(1 + (doc_count - len(posting) + 0.5) / (len(posting) + 0.5))
+                for doc_id, tf in list(posting.items()):
+                    norm = 1 - self.B + self.B * self.doc_lengths[doc_id] / average_length
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.K1 + 1) / (tf + self.K1 * norm)
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+
+    def to_dict(self) -> dict:
+        return {"doc_lengths": self.doc_lengths, "postings": self.postings}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "FullTextIndex":
+        index = cls()
+        index.postings = data["postings"]
+        index.doc_lengths = data["doc_lengths"]
+        index._total_length = sum(index.doc_lengths.values())
+        index._terms = sorted(index.postings)
+        return index
+
+
+class CatalogColumns:
+    # Columnar mirror of the catalog for analytics: one row per book with a
+    # dictionary-encoded genre column, an author code column and an
+    # availability column. The columns are array.array buffers, which NumPy
+    # (when installed) reads as zero-copy views.
+    def __init__(self):
+        self.book_ids = []
+        self.genres = []
+        self.authors = []
+        self.genre = array("H")
+        self.author = array("I")
+        self.available = array("B")
+        self._rows = {}
+        self._genre_codes = {}
+        self._author_codes = {}
+        for genre in Book.GENRES:
+            self._encode(genre, self._genre_codes, self.genres)
+
+    def __len__(self) -> int:
+        return len(self.book_ids)
+
+    @staticmethod
+    def _encode(value: str, codes: dict, dictionary: list) -> int:
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(dictionary)
+            dictionary.append(value)
+        return code
+
+    def add(self, book: Book) -> None:
+        genre = self._encode(book.genre, self._genre_codes, self.genres)
+        author = self._encode(book.author, self._author_codes, self.authors)
+        row = self._rows.get(book.book_id)
+        if row is None:
+            self._rows[book.book_id] = len(self.book_ids)
+            self.book_ids.append(book.book_id)
+            self.genre.append(genre)
+            self.author.append(author)
+            self.available.append(bool(book.available))
+        else:
+            self.genre[row] = genre
+            self.author[row] = author
+            self.available[row] = bool(book.available)
+
+    def set_available(self, book_id: str, available: bool) -> None:
+        self.available[self._rows[book_id]] = bool(available)
+
+    @staticmethod
+    def _view(column: array):
+        return numpy.frombuffer(column, dtype=f"u{column.itemsize}")
+
+    def genre_counts(self) -> dict:
+        if numpy is not None and self.book_ids:
+            counts = numpy.bincount(self._view(self.genre), minlength=len(self.genres))
+            return dict(zip(self.genres, counts.tolist()))
+        tally = Counter(self.genre)
+        return {genre: tally[code] for code, genre in enumerate(self.genres)}
+
+    def availability_ratio(self, by_genre: bool = False):
+        if not by_genre:
+            return sum(self.available) / len(self.book_ids) if self.book_ids else 0.0
+        if numpy is not None and self.book_ids:
+            genre = self._view(self.genre)
+            available = self._view(self.available)
+            totals = numpy.bincount(genre, minlength=len(self.genres)).tolist()
+            hits = numpy.bincount(genre, weights=available, minlength=len(self.genres)).tolist()
+        else:
+            tally = Counter(self.genre)
+            hit_tally = Counter(compress(self.genre, self.available))
+            totals = [tally[code] for code in range(len(self.genres))]
+            hits = [hit_tally[code] for code in range(len(self.genres))]
+        return {genre: hits[code] / totals[code] if totals[code] else 0.0 for code, genre in enumerate(self.genres)}
+
+    def filter(self, genre: str = None, author: str = None, available: bool = None) -> list:
+        conditions = []
+        for value, codes, column in ((genre, self._genre_codes, self.genre), (author, self._author_codes, self.author)):
+            if value is not None:
+                if value not in codes:
+                    return []
+                conditions.append((column, codes[value]))
+        if available is not None:
+            conditions.append((self.available, int(bool(available))))
+        if numpy is not None and self.book_ids:
+            mask = numpy.ones(len(self.book_ids), dtype=bool)
+            for column, code in conditions:
+                mask &= self._view(column) == code
+            return [self.book_ids[row] for row in numpy.flatnonzero(mask).tolist()]
+        rows = range(len(self.book_ids))
+        for column, code in conditions:
+            rows = [row for row in rows if column[row] == code]
+        return [self.book_ids[row] for row in rows]
+
+
+def _timestamp(value) -> str:
+    if isinstance(value, datetime):
+        return value.isoformat(timespec="seconds")
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+class LoanLedger:
+    # Append-only history of checkouts and returns, partitioned by month
+    # into loans-YYYY-MM.jsonl files. A range query reads only the months
+    # it overlaps; each loaded month is kept as a list of
+    # (timestamp, event, book_id, borrower_id) tuples sorted by timestamp,
+    # so ranges are found with bisect. At most max_cached months stay in
+    # memory (least recently used are dropped).
+    def __init__(self, directory: str, max_cached: int = 12):
+        self.directory = directory
+        self.max_cached = max_cached
+        self._partitions = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _partition_file(self, month: str) -> str:
+        return os.path.join(self.directory, f"loans-{month}.jsonl")
+
+    def record(self, event: str, book_id: str, borrower_id: str, when=None) -> None:
+        timestamp = _timestamp(when or datetime.now())
+        month = timestamp[:7]
+        line = json.dumps({"ts": timestamp, "event": event, "book_id": book_id, "borrower_id": borrower_id}) + "\n"
+        with self._lock:
+            with open(self._partition_file(month), "a", encoding="utf-8") as f:
+                f.write(line)
+            if month in self._partitions:
+                bisect.insort(self._partitions[month], (timestamp, event, book_id, borrower_id))
+
+    def _partition(self, month: str) -> list:
+        events = self._partitions.get(month)
+        if events is not None:
+            self._partitions.move_to_end(month)
+            return events
+        events = []
+        try:
+            with open(self._partition_file(month), "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        e = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # torn write
+                    events.append((e["ts"], e["event"], e["book_id"], e["borrower_id"]))
+        except FileNotFoundError:
+            return events
+        events.sort()
+        self._partitions[month] = events
+        while len(self._partitions) > self.max_cached:
+            self._partitions.popitem(last=False)
+        return events
+
+    def _months(self, start: str, end: str):
+        year, month = int(start[:4]), int(start[5:7])
+        while f"{year:04d}-{month:02d}" <= end[:7]:
+            yield f"{year:04d}-{month:02d}"
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+    def events_between(self, start, end, event: str = None):
+        start, end = _timestamp(start), _timestamp(end)
+        for month in self._months(start, end):
+            with self._lock:
+                events = self._partition(month)
+                lo = bisect.bisect_left(events, (start,))
+                hi = bisect.bisect_left(events, (end,))
+                events = events[lo:hi]
+            for timestamp, kind, book_id, borrower_id in events:
+                if event is None or kind == event:
+                    yield {"ts": timestamp, "event": kind, "book_id": book_id, "borrower_id": borrower_id}
+
+    def loans_between(self, start, end) -> list:
+        return list(self.events_between(start, end, "checkout"))
+
+    def checkouts_per_day(self, start, end) -> dict:
+        return dict(Counter(e["ts"][:10] for e in self.events_between(start, end, "checkout")))
+
+    def top_borrowed(self, n: int = 10, window=None) -> list:
+        if window is None:
+            months = sorted(name[6:13] for name in os.listdir(self.directory) if name.startswith("loans-"))
+            if not months:
+                return []
+            window = (months[0], f"{months[-1]}-99")
+        elif isinstance(window, timedelta):
+            now = datetime.now()
+            window = (now - window, now + timedelta(seconds=1))
+        counts = Counter(e["book_id"] for e in self.events_between(*window, event="checkout"))
+        return counts.most_common(n)
+
+
+def _overdue_entry(book_id: str, title: str, borrower: Borrower, checkout_date: str, today: datetime) -> dict:
+    return {
+        "book_id": book_id,
+        "title": title,
+        "borrower_id": borrower.borrower_id,
+        "name": borrower.name,
+        "email": borrower.email,
+        "checkout_date": checkout_date,
+        "days_out": (today - datetime.strptime(checkout_date, "%Y-%m-%d")).days
+    }
+
+
+def _flush_periodically(ref, stop: threading.Event, interval: float) -> None:
+    # Holds only a weak reference, so an abandoned Library can still be
+    # collected; the thread exits with it.
+    while not stop.wait(interval / 4):
+        library = ref()
+        if library is None:
+            return
+        library._flush_on_timer()
+        del library
+
+
 class Library:
-    def __init__(self, name: str, data_dir: str = "."):
+    INDEXED_FIELDS = ("title", "author", "genre", "available")
+    STORAGE_FORMATS = {"json": ".json", "jsonl": ".jsonl", "binary": ".bin"}
+    # Which snapshot files each journal operation changes
+    DIRTIES = {
+        "add_book": ("books",),
+        "add_borrower": ("borrowers",),
+        "checkout": ("books", "borrowers"),
+        "return": ("books", "borrowers"),
+        "lend": ("books",),
+        "unlend": ("books",),
+        "borrow": ("borrowers",),
+        "unborrow": ("borrowers",)
+    }
+
+    def __init__(self, name: str, data_dir: str = ".", journal: bool = False, compact_every: int = 1000,
+                 storage: str = "json", thread_safe: bool = False, autosave: bool = True,
+                 durable: bool = True, lazy: bool = False, full_text: bool = False,
+                 columnar: bool = False, ledger_dir: str = None, flush_every: int = None,
+                 flush_interval: float = None):
+        if storage not in Library.STORAGE_FORMATS:
+            raise ValueError(f"Invalid storage format: {storage}")
+        if lazy and storage != "jsonl":
+            raise ValueError("Lazy loading requires jsonl storage")
         self.name = name
         self.books = {}
         self.borrowers = {}
-        self.books_file = os.path.join(data_dir, "library_books.json")
-        self.borrowers_file = os.path.join(data_dir, "library_borrowers.json")
+        self.storage = storage
+        self.data_dir = data_dir
+        self.durable = durable
+        self.lazy = lazy
+        self.full_text = full_text
+        self.columnar = columnar
+        self.ledger = LoanLedger(ledger_dir) if ledger_dir else None
+        extension = Library.STORAGE_FORMATS[storage]
+        self.books_file = os.path.join(data_dir, "library_books" + extension)
+        self.borrowers_file = os.path.join(data_dir, "library_borrowers" + extension)
+        self.offsets_file = self.books_file + ".idx"
+        self.full_text_file = os.path.join(data_dir, "library_fulltext.json")
+        self.journal_file = os.path.join(data_dir, "library_journal.jsonl")
+        self.manifest_file = os.path.join(data_dir, "library_manifest.json")
+        self.state_file = os.path.join(data_dir, "library_state.json")
+        self.journal = journal
+        self.compact_every = compact_every
+        self._journal_entries = 0
+        self._journal_seq = 0
+        # Flush policy: with autosave off only flush(), save() and batch()
+        # write. Otherwise a mutation writes immediately, unless flush_every
+        # (operations) or flush_interval (milliseconds) is set, in which case
+        # it writes once either threshold is reached. A background thread
+        # also writes pending changes flush_interval after the last write, so
+        # they do not wait for the next mutation; it needs the locks, so it
+        # turns on thread_safe. Journal mode appends (and, when durable,
+        # fsyncs) every operation already; there the policy only governs
+        # compaction.
+        self.autosave = autosave
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._flushed_at = time.monotonic()
+        self._batch_depth = 0
+        self._change_seq = 0
+        self._saved_seq = 0
+        self._file_seq = {"books": 0, "borrowers": 0}
+        timed_flush = flush_interval is not None and autosave and not journal
+        # Lock order: book -> borrower -> persistence -> state. Readers take
+        # no locks; they only iterate over list() snapshots of shared dicts.
+        self.thread_safe = thread_safe = thread_safe or timed_flush
+        self._book_locks = _LockTable(thread_safe)
+        self._borrower_locks = _LockTable(thread_safe)
+        self._persist_lock = threading.RLock() if thread_safe else nullcontext()
+        self._state_lock = threading.RLock() if thread_safe else nullcontext()
+        self._stop_flusher = threading.Event()
         self.load()
+        if timed_flush:
+            threading.Thread(target=_flush_periodically, daemon=True,
+                             args=(weakref.ref(self), self._stop_flusher, flush_interval / 1000)).start()
+
+    def __enter__(self) -> "Library":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._stop_flusher.set()
+        self.flush()
 
     def load(self) -> None:
+        self._finish_publish()
+        self.books = {}
+        self.borrowers = {}
+        self._indexes = {field: {} for field in Library.INDEXED_FIELDS}
+        self._book_ids = IdAllocator("BOOK")
+        self._borrower_ids = IdAllocator("USER")
+        self._holders = {}
+        self._positions = {}
+        self._available_count = 0
+        self._genre_counts = {genre: 0 for genre in Book.GENRES}
+        self._full_text = self._load_full_text() if self.full_text else None
+        self.columns = CatalogColumns() if self.columnar else None
+        if self.lazy and os.path.exists(self.books_file):
+            self._load_lazy()
+        else:
+            for book in self._read_objects(self.books_file, Book):
+                self._put_book(book)
+        for borrower in self._read_objects(self.borrowers_file, Borrower):
+            self._put_borrower(borrower)
+        if self.journal:
+            self._replay_journal()
+        if self._full_text is not None and len(self._full_text) != len(self.books):
+            self._full_text = FullTextIndex()
+            self._full_text_saved = None
+            self._index_full_text()
+        if self.columns is not None and len(self.columns) != len(self.books):
+            for book in list(self.books.values()):
+                self.columns.add(book)
+
+    def save(self) -> None:
+        self._save(("books", "borrowers"))
+
+    def flush(self) -> None:
+        if self.journal:
+            self.compact()
+        else:
+            self._save_changes()
+
+    @contextmanager
+    def batch(self):
+        # Defers writes for every thread until the outermost batch exits,
+        # then writes the changed files once.
+        with self._state_lock:
+            self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self._state_lock:
+                self._batch_depth -= 1
+                done = self._batch_depth == 0
+            if done:
+                self.flush()
+
+    def _save(self, files: tuple = None) -> None:
+        # files=None writes only the files changed since the last save
+        with self._persist_lock:
+            with self._state_lock:
+                seq = self._change_seq
+                journal_seq = self._journal_seq if self.journal else None
+                if files is None:
+                    files = tuple(f for f, changed in self._file_seq.items() if changed > self._saved_seq)
+                books, borrowers = self._snapshot(files)
+            if files:
+                self._write_snapshot(books, borrowers, journal_seq)
+            self._saved_seq = seq
+            self._flushed_at = time.monotonic()
+
+    def export(self, directory: str, storage: str = "json") -> None:
+        if storage not in Library.STORAGE_FORMATS:
+            raise ValueError(f"Invalid storage format: {storage}")
+        extension = Library.STORAGE_FORMATS[storage]
+        with self._state_lock:
+            books, borrowers = self._snapshot()
+            books, borrowers = list(books), list(borrowers)
+        for stem, records in (("library_books", books), ("library_borrowers", borrowers)):
+            path = os.path.join(directory, stem + extension)
+            os.replace(_stage_records(path, storage, records, self.durable), path)
+
+    def _save_changes(self) -> None:
+        # Group commit: threads queued behind a save that already covered
+        # their change return without writing (and fsyncing) again.
+        seq = self._change_seq
+        with self._persist_lock:
+            if self._saved_seq < seq:
+                self._save()
+
+    def _snapshot(self, files: tuple = ("books", "borrowers")) -> tuple:
+        books = borrowers = None
+        if "books" in files:
+            if isinstance(self.books, _LazyBooks):
+                books = self.books.records()
+            else:
+                books = (b.to_dict() for b in self.books.values())
+        if "borrowers" in files:
+            borrowers = (br.to_dict() for br in self.borrowers.values())
+        if self.thread_safe:
+            # Materialized under the state lock so the files can be written
+            # without it
+            books = None if books is None else list(books)
+            borrowers = None if borrowers is None else list(borrowers)
+        return books, borrowers
+
+    def _write_snapshot(self, books, borrowers, journal_seq: int = None) -> None:
+        # Either side may be None: that file is unchanged and not rewritten.
+        # journal_seq, the last journal entry the snapshot includes, is
+        # published with it in the state file.
+        renames = []
+        try:
+            for path, records in ((self.books_file, books), (self.borrowers_file, borrowers)):
+                if records is not None:
+                    renames.append((_stage_records(path, self.storage, records, self.durable), path))
+            if journal_seq is not None:
+                f, tmp_path = create_temp_file(self.state_file)
+                renames.append((tmp_path, self.state_file))
+                with f:
+                    json.dump({"journal_seq": journal_seq}, f)
+                    f.flush()
+                    if self.durable:
+                        os.fsync(f.fileno())
+            # The manifest is the commit point: once it exists all temp files
+            # are complete, and load() finishes renames interrupted by a crash.
+            with atomic_write(self.manifest_file, durable=self.durable) as f:
+                json.dump([[os.path.basename(tmp), os.path.basename(path)] for tmp, path in renames], f)
+        except BaseException:
+            for tmp, _ in renames:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+            raise
+        self._finish_publish()
+        if books is None:
+            return
+        if isinstance(self.books, _LazyBooks):
+            self.books.reindexed(self._build_offsets()["count"])
+        if self.full_text:
+            self._save_full_text()
+
+    def _finish_publish(self) -> None:
         try:
-            with open(self.books_file, "r", encoding="utf-8") as f:
-                books_data = json.load(f)
-                self.books = {b["book_id"]: Book.from_dict(b) for b in books_data}
+            with open(self.manifest_file, "r", encoding="utf-8") as f:
+                renames = json.load(f)
         except FileNotFoundError:
-            self.books = {}
+            return
+        for tmp, target in renames:
+            tmp_path = os.path.join(self.data_dir, tmp)
+            if os.path.exists(tmp_path):
+                os.replace(tmp_path, os.path.join(self.data_dir, target))
+        if self.durable:
+            sync_directory(self.data_dir)
+        os.remove(self.manifest_file)
+
+    # -------------------------------------------------------------------------
+    # Lazy loading
+    # -------------------------------------------------------------------------
+    # The offset index file starts with a JSON header (books file size and
+    # mtime, book count, statistics counters, ID high-water mark) followed by
+    # one "book_id<TAB>offset<TAB>length" line per book. Startup reads only
+    # the header; the offsets are read on first access to a book and the
+    # secondary indexes are built on the first search.
+
+    def _load_lazy(self) -> None:
+        header = self._read_offsets_header()
+        self.books = _LazyBooks(self.books_file, header["count"], self._read_offsets)
+        self._indexes = None
+        self._available_count = header["available"]
+        self._genre_counts.update(header["books_by_genre"])
+        self._book_ids.high_water = header["high_water"]
+
+    def _read_offsets_header(self) -> dict:
+        stat = os.stat(self.books_file)
         try:
-            with open(self.borrowers_file, "r", encoding="utf-8") as f:
-                borrowers_data = json.load(f)
-                self.borrowers = {br["borrower_id"]: Borrower.from_dict(br) for br in borrowers_data}
+            with open(self.offsets_file, "r", encoding="utf-8") as f:
+                header = json.loads(f.readline())
+            if header["size"] == stat.st_size and header["mtime_ns"] == stat.st_mtime_ns:
+                return header
+        except (FileNotFoundError, ValueError, KeyError):
+            pass
+        return self._build_offsets()
+
+    def _build_offsets(self) -> dict:
+        offsets = []
+        available = 0
+        books_by_genre = {genre: 0 for genre in Book.GENRES}
+        ids = IdAllocator("BOOK")
+        with open(self.books_file, "rb") as f:
+            position = 0
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    offsets.append((record["book_id"], position, len(line)))
+                    available += bool(record.get("available", True))
+                    books_by_genre[record["genre"]] = books_by_genre.get(record["genre"], 0) + 1
+                    ids.observe(record["book_id"])
+                position += len(line)
+        stat = os.stat(self.books_file)
+        header = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "count": len(offsets),
+            "available": available,
+            "books_by_genre": books_by_genre,
+            "high_water": ids.high_water
+        }
+        with atomic_write(self.offsets_file, durable=self.durable) as f:
+            f.write(json.dumps(header) + "\n")
+            for book_id, offset, length in offsets:
+                f.write(f"{book_id}\t{offset}\t{length}\n")
+        return header
+
+    def _read_offsets(self) -> dict:
+        offsets = {}
+        with open(self.offsets_file, "r", encoding="utf-8") as f:
+            f.readline()
+            for line in f:
+                book_id, offset, length = line.rstrip("\n").split("\t")
+                offsets[book_id] = (int(offset), int(length))
+        return offsets
+
+    def _ensure_indexes(self) -> None:
+        if self._indexes is None:
+            self._indexes = {field: {} for field in Library.INDEXED_FIELDS}
+            self._positions = {}
+            for book in list(self.books.values()):
+                self._positions[book.book_id] = len(self._positions)
+                self._index_book(book)
+
+    # -------------------------------------------------------------------------
+    # Full-text index
+    # -------------------------------------------------------------------------
+    # Titles and authors never change and books are never removed, so the
+    # index only goes stale when books are added. It is stamped with the
+    # book count and ID high-water mark and rewritten after a snapshot only
+    # when that stamp moved. On load, books missing from it are added; an
+    # index holding documents that are not in the catalog is rebuilt.
+
+    def _full_text_stamp(self) -> list:
+        return [len(self.books), self._book_ids.high_water]
+
+    def _load_full_text(self) -> FullTextIndex:
+        self._full_text_saved = None
+        try:
+            with open(self.full_text_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            index = FullTextIndex.from_dict(data["index"])
+            self._full_text_saved = data["stamp"]
+            return index
+        except (FileNotFoundError, ValueError, KeyError):
+            return FullTextIndex()
+
+    def _save_full_text(self) -> None:
+        with self._state_lock:
+            stamp = self._full_text_stamp()
+            if stamp == self._full_text_saved:
+                return
+            index = json.dumps(self._full_text.to_dict())
+        with atomic_write(self.full_text_file, durable=self.durable) as f:
+            f.write(f'{{"stamp": {json.dumps(stamp)}, "index": {index}}}')
+        self._full_text_saved = stamp
+
+    def _index_full_text(self) -> None:
+        for book in list(self.books.values()):
+            self._full_text.add(book.book_id, f"{book.title} {book.author}")
+
+    def _read(self, path: str):
+        # A JSON Lines library with no .jsonl file yet migrates from the
+        # legacy JSON array file; the next save() writes JSON Lines.
+        if not os.path.exists(path) and self.storage != "json":
+            legacy = os.path.splitext(path)[0] + ".json"
+            if os.path.exists(legacy):
+                return _read_records(legacy, "json")
+        if not os.path.exists(path):
+            return iter(())
+        return _read_records(path, self.storage)
+
+    def _read_objects(self, path: str, cls):
+        # The columns of a binary snapshot are the to_dict() fields, which
+        # are also the constructor arguments. Columns are matched to the
+        # arguments by name, so objects are built straight from the columns
+        # without a dict per record; a snapshot with other fields is refused.
+        if self.storage == "binary" and os.path.exists(path):
+            fields, columns = _read_columns(path)
+            if not columns:
+                return iter(())
+            params = list(inspect.signature(cls).parameters)
+            if sorted(fields) != sorted(params):
+                raise ValueError(f"Snapshot fields {fields} do not match {cls.__name__}: {path}")
+            by_name = dict(zip(fields, columns))
+            return map(cls, *(by_name[param] for param in params))
+        return map(cls.from_dict, self._read(path))
+
+    # -------------------------------------------------------------------------
+    # Mutation journal
+    # -------------------------------------------------------------------------
+    # Each mutation is a single JSON line appended to the journal, numbered
+    # with a sequence number that keeps growing across compactions. Every
+    # snapshot records the last number it includes, and replay skips entries
+    # at or below it, so a journal replayed over a newer snapshot (after
+    # save(), or a crash between the snapshot and the truncate in compact())
+    # never applies an operation twice.
+
+    def compact(self) -> None:
+        # No journal append may land between the snapshot and the truncate
+        with self._persist_lock, self._state_lock:
+            self._write_snapshot(*self._snapshot(), self._journal_seq)
+            with open(self.journal_file, "w", encoding="utf-8"):
+                pass
+            self._journal_entries = 0
+            self._saved_seq = self._change_seq
+            self._flushed_at = time.monotonic()
+
+    def _log(self, entry: dict) -> None:
+        # Called with the state lock held, so journal order is mutation order
+        if self.journal:
+            self._journal_seq += 1
+            with open(self.journal_file, "a", encoding="utf-8") as f:
+                f.write(json.dumps(dict(entry, seq=self._journal_seq)) + "\n")
+                f.flush()
+                if self.durable:
+                    os.fsync(f.fileno())
+            self._journal_entries += 1
+        self._change_seq += 1
+        for name in Library.DIRTIES[entry["op"]]:
+            self._file_seq[name] = self._change_seq
+
+    def _persist(self) -> None:
+        if not self.autosave or self._batch_depth:
+            return
+        if self.journal:
+            if self._journal_entries >= self.compact_every:
+                self.compact()
+        elif self._flush_due():
+            self._save_changes()
+
+    def _flush_due(self) -> bool:
+        if self.flush_every is None and self.flush_interval is None:
+            return True
+        if self.flush_every is not None and self._change_seq - self._saved_seq >= self.flush_every:
+            return True
+        return (self.flush_interval is not None
+                and (time.monotonic() - self._flushed_at) * 1000 >= self.flush_interval)
+
+    def _flush_on_timer(self) -> None:
+        with self._state_lock:
+            due = not self._batch_depth and self._saved_seq < self._change_seq and self._flush_due()
+        if due:
+            self._save_changes()
+
+    def _replay_journal(self) -> None:
+        self._journal_entries = 0
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                self._journal_seq = json.load(f)["journal_seq"]
+        except FileNotFoundError:
+            self._journal_seq = 0
+        snapshot_seq = self._journal_seq
+        try:
+            with open(self.journal_file, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        break  # torn write at the tail of the journal
+                    self._journal_entries += 1
+                    seq = entry.get("seq")
+                    if seq is None:
+                        self._apply(entry)  # written before entries were numbered
+                    elif seq > snapshot_seq:
+                        self._apply(entry)
+                        self._journal_seq = seq
         except FileNotFoundError:
-            self.borrowers = {}
+            pass
 
-    def save(self) -> None:
-        with open(self.books_file, "w", encoding="utf-8") as f:
-            json.dump([b.to_dict() for b in self.books.values()], f, indent=2)
-        with open(self.borrowers_file, "w", encoding="utf-8") as f:
-            json.dump([br.to_dict() for br in self.borrowers.values()], f, indent=2)
+    def _apply(self, entry: dict) -> None:
+        op = entry["op"]
+        if op == "add_book":
+            if entry["book"]["book_id"] not in self.books:
+                self._put_book(Book.from_dict(entry["book"]))
+        elif op == "add_borrower":
+            if entry["borrower"]["borrower_id"] not in self.borrowers:
+                self._put_borrower(Borrower.from_dict(entry["borrower"]))
+        elif op == "checkout":
+            book = self.books.get(entry["book_id"])
+            borrower = self.borrowers.get(entry["borrower_id"])
+            if book and borrower and not borrower.has_book(book.book_id):
+                self._do_checkout(book, borrower, entry.get("date"))
+        elif op == "return":
+            book = self.books.get(entry["book_id"])
+            borrower = self.borrowers.get(entry["borrower_id"])
+            if book and borrower and borrower.has_book(book.book_id):
+                self._do_return(book, borrower)
+        # Halves of a loan whose book and borrower live on different shards
+        # of a ShardedLibrary
+        elif op in ("lend", "unlend"):
+            book = self.books.get(entry["book_id"])
+            if book and book.available == (op == "lend"):
+                self._set_available(book, op == "unlend")
+        elif op == "borrow":
+            borrower = self.borrowers.get(entry["borrower_id"])
+            if borrower and not borrower.has_book(entry["book_id"]):
+                borrower.borrow_book(entry["book_id"], entry.get("date"))
+                self._holders[entry["book_id"]] = borrower.borrower_id
+        elif op == "unborrow":
+            borrower = self.borrowers.get(entry["borrower_id"])
+            if borrower and borrower.has_book(entry["book_id"]):
+                borrower.return_book(entry["book_id"])
+                self._holders.pop(entry["book_id"], None)
+        else:
+            raise ValueError(f"Unknown journal operation: {op}")
+
+    # -------------------------------------------------------------------------
+    # State primitives shared by live operations and journal replay
+    # -------------------------------------------------------------------------
+
+    def _put_book(self, book: Book) -> None:
+        if book.book_id in self.books:
+            self._unindex_book(self.books[book.book_id])
+            self._count_book(self.books[book.book_id], -1)
+        self.books[book.book_id] = book
+        self._positions.setdefault(book.book_id, len(self._positions))
+        self._book_ids.observe(book.book_id)
+        self._index_book(book)
+        self._count_book(book, 1)
+        if self._full_text is not None:
+            self._full_text.add(book.book_id, f"{book.title} {book.author}")
+        if self.columns is not None:
+            self.columns.add(book)
+
+    def _put_borrower(self, borrower: Borrower) -> None:
+        self.borrowers[borrower.borrower_id] = borrower
+        self._borrower_ids.observe(borrower.borrower_id)
+        for book_id in borrower.borrowed_books:
+            self._holders[book_id] = borrower.borrower_id
+
+    def _do_checkout(self, book: Book, borrower: Borrower, checkout_date: str = None) -> None:
+        self._set_available(book, False)
+        borrower.borrow_book(book.book_id, checkout_date)
+        self._holders[book.book_id] = borrower.borrower_id
+
+    def _do_return(self, book: Book, borrower: Borrower) -> None:
+        self._set_available(book, True)
+        borrower.return_book(book.book_id)
+        self._holders.pop(book.book_id, None)
+
+    def _set_available(self, book: Book, available: bool) -> None:
+        if self._indexes is not None:
+            postings = self._indexes["available"]
+            postings.get(book.available, {}).pop(book.book_id, None)
+            postings.setdefault(available, {})[book.book_id] = None
+        self._available_count += int(available) - int(book.available)
+        book.available = available
+        if self.columns is not None:
+            self.columns.set_available(book.book_id, available)
+
+    def _count_book(self, book: Book, delta: int) -> None:
+        self._genre_counts[book.genre] = self._genre_counts.get(book.genre, 0) + delta
+        if book.available:
+            self._available_count += delta
+
+    # -------------------------------------------------------------------------
+    # Secondary indexes
+    # -------------------------------------------------------------------------
+    # Each index maps a casefolded field value to a posting "set" of book IDs
+    # (a dict). Checkouts and returns move books between the availability
+    # postings and __in lookups merge several, so results are sorted back
+    # into catalog order by each book's position.
+
+    def _index_book(self, book: Book) -> None:
+        if self._indexes is None:
+            return
+        for field in Library.INDEXED_FIELDS:
+            key = _index_key(getattr(book, field))
+            self._indexes[field].setdefault(key, {})[book.book_id] = None
+
+    def _unindex_book(self, book: Book) -> None:
+        if self._indexes is None:
+            return
+        for field in Library.INDEXED_FIELDS:
+            key = _index_key(getattr(book, field))
+            posting = self._indexes[field].get(key)
+            if posting is not None:
+                posting.pop(book.book_id, None)
+                if not posting:
+                    del self._indexes[field][key]
+
+    def _lookup(self, **criteria):
+        self._ensure_indexes()
+        postings = []
+        for key, value in criteria.items():
+            field, op = _split_criterion(key)
+            if field not in self._indexes or op not in ("eq", "in"):
+                return None
+            index = self._indexes[field]
+            try:
+                if op == "eq":
+                    postings.append(index.get(_index_key(value), {}))
+                else:
+                    union = {}
+                    for v in value:
+                        union.update(index.get(_index_key(v), {}))
+                    postings.append(union)
+            except TypeError:
+                return None  # unhashable query value
+        if not postings:
+            return list(self.books)
+        postings.sort(key=len)
+        smallest, rest = list(postings[0]), postings[1:]
+        return self._in_catalog_order([bid for bid in smallest if all(bid in p for p in rest)])
+
+    def _in_catalog_order(self, book_ids: list) -> list:
+        book_ids.sort(key=self._positions.__getitem__)
+        return book_ids
+
+    # -------------------------------------------------------------------------
+    # Public API
+    # -------------------------------------------------------------------------
 
     def add_book(self, title: str, author: str, genre: str) -> Book:
-        new_id = generate_id("BOOK", list(self.books.keys()))
-        book = Book(new_id, title, author, genre)
-        self.books[new_id] = book
-        self.save()
-        return book
+        return self._add_book(None, title, author, genre)
 
     def add_borrower(self, name: str, email: str) -> Borrower:
-        new_id = generate_id("USER", list(self.borrowers.keys()))
-        borrower = Borrower(new_id, name, email)
-        self.borrowers[new_id] = borrower
-        self.save()
+        return self._add_borrower(None, name, email)
+
+    def _add_book(self, book_id, title: str, author: str, genre: str) -> Book:
+        # book_id=None allocates the next ID; a ShardedLibrary shard is given
+        # IDs allocated by its coordinator
+        with self._state_lock:
+            book = Book(book_id or self._book_ids.peek(), title, author, genre)
+            self._put_book(book)
+            self._log({"op": "add_book", "book": book.to_dict()})
+        self._persist()
+        return book
+
+    def _add_borrower(self, borrower_id, name: str, email: str) -> Borrower:
+        with self._state_lock:
+            borrower = Borrower(borrower_id or self._borrower_ids.peek(), name, email)
+            self._put_borrower(borrower)
+            self._log({"op": "add_borrower", "borrower": borrower.to_dict()})
+        self._persist()
         return borrower
 
     def checkout_book(self, book_id: str, borrower_id: str) -> bool:
-        if book_id not in self.books or borrower_id not in self.borrowers:
-            return False
-        book = self.books[book_id]
-        borrower = self.borrowers[borrower_id]
-        if not book.available or not borrower.can_borrow():
-            return False
-        book.available = False
-        borrower.borrow_book(book_id)
-        self.save()
+        with self._book_locks(book_id), self._borrower_locks(borrower_id):
+            if book_id not in self.books or borrower_id not in self.borrowers:
+                return False
+            book = self.books[book_id]
+            borrower = self.borrowers[borrower_id]
+            if not book.available or not borrower.can_borrow():
+                return False
+            now = datetime.now()
+            checkout_date = format_date(now)
+            with self._state_lock:
+                self._do_checkout(book, borrower, checkout_date)
+                self._log({"op": "checkout", "book_id": book_id, "borrower_id": borrower_id, "date": checkout_date})
+            self._persist()
+            if self.ledger is not None:
+                self.ledger.record("checkout", book_id, borrower_id, now)
         return True
 
     def return_book(self, book_id: str, borrower_id: str) -> bool:
-        if book_id not in self.books or borrower_id not in self.borrowers:
-            return False
-        book = self.books[book_id]
-        borrower = self.borrowers[borrower_id]
-        if book_id not in borrower.borrowed_books:
-            return False
-        book.available = True
-        borrower.return_book(book_id)
-        self.save()
+        with self._book_locks(book_id), self._borrower_locks(borrower_id):
+            if book_id not in self.books or borrower_id not in self.borrowers:
+                return False
+            book = self.books[book_id]
+            borrower = self.borrowers[borrower_id]
+            if not borrower.has_book(book_id):
+                return False
+            with self._state_lock:
+                self._do_return(book, borrower)
+                self._log({"op": "return", "book_id": book_id, "borrower_id": borrower_id})
+            self._persist()
+            if self.ledger is not None:
+                self.ledger.record("return", book_id, borrower_id)
         return True
 
-    def search_books(self, **criteria) -> list:
-        books_data = [b.to_dict() for b in self.books.values()]
-        return search_items(books_data, **criteria)
+    def add_books_bulk(self, records) -> dict:
+        def add(title, author, genre):
+            with self._state_lock:
+                self._put_book(Book(self._book_ids.peek(), title, author, genre))
+        return self._ingest(records, ("title", "author", "genre"), add)
+
+    def add_borrowers_bulk(self, records) -> dict:
+        def add(name, email):
+            with self._state_lock:
+                self._put_borrower(Borrower(self._borrower_ids.peek(), name, email))
+        return self._ingest(records, ("name", "email"), add)
+
+    def _ingest(self, records, fields: tuple, add) -> dict:
+        return _ingest_records(records, fields, add, self.compact if self.journal else self.save)
+
+    def search_books(self, query: Query = None, /, **criteria) -> list:
+        query = _as_query(query, criteria)
+        book_ids = self._lookup(**query.criteria)
+        if book_ids is not None:
+            return [self.books[bid].to_dict() for bid in book_ids]
+        books_data = [b.to_dict() for b in list(self.books.values())]
+        return search_items(books_data, query)
+
+    def full_text_search(self, query: str, limit: int = 10, prefix: bool = True) -> list:
+        if self._full_text is None:
+            self._full_text = FullTextIndex()
+            self._index_full_text()
+        results = []
+        for book_id, score in self._full_text.search(query, limit, prefix):
+            results.append(dict(self.books[book_id].to_dict(), score=score))
+        return results
 
     def get_available_books(self) -> list:
-        return [b for b in self.books.values() if b.available]
+        self._ensure_indexes()
+        book_ids = self._in_catalog_order(list(self._indexes["available"].get(True, {})))
+        return [self.books[bid] for bid in book_ids]
 
     def get_borrower_books(self, borrower_id: str) -> list:
         if borrower_id not in self.borrowers:
@@ -215,7 +1514,38 @@ class Library:
         borrower = self.borrowers[borrower_id]
         return [self.books[bid] for bid in borrower.borrowed_books if bid in self.books]
 
+    def get_holder(self, book_id: str):
+        borrower_id = self._holders.get(book_id)
+        return self.borrowers[borrower_id] if borrower_id is not None else None
+
+    def get_overdue_report(self, days: int = 14, today: datetime = None) -> list:
+        today = today or datetime.now()
+        report = []
+        for book_id, borrower_id in list(self._holders.items()):
+            # A loan's book may live elsewhere (another shard) or be missing
+            # from a legacy file; like get_borrower_books, skip it
+            if book_id not in self.books:
+                continue
+            borrower = self.borrowers[borrower_id]
+            checkout_date = borrower.get_checkout_date(book_id)
+            if checkout_date is not None:
+                entry = _overdue_entry(book_id, self.books[book_id].title, borrower, checkout_date, today)
+                if entry["days_out"] > days:
+                    report.append(entry)
+        report.sort(key=lambda entry: entry["days_out"], reverse=True)
+        return report
+
     def get_statistics(self) -> dict:
+        total_books = len(self.books)
+        return {
+            "total_books": total_books,
+            "available_books": self._available_count,
+            "checked_out": total_books - self._available_count,
+            "total_borrowers": len(self.borrowers),
+            "books_by_genre": dict(self._genre_counts)
+        }
+
+    def _recount_statistics(self) -> dict:
         total_books = len(self.books)
         available_books = sum(1 for b in self.books.values() if b.available)
         checked_out = total_books - available_books
@@ -229,4 +1559,796 @@ class Library:
             "checked_out": checked_out,
             "total_borrowers": total_borrowers,
             "books_by_genre": books_by_genre
-        }
\ No newline at end of file
+        }
+
+    def check_statistics(self) -> bool:
+        return self.get_statistics() == self._recount_statistics()
+
+
+# =============================================================================
+# PART 5: SQLITE STORAGE ENGINE
+# =============================================================================
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS books (
+    book_id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    author TEXT NOT NULL,
+    genre TEXT NOT NULL,
+    available INTEGER NOT NULL DEFAULT 1,
+    title_key TEXT NOT NULL,
+    author_key TEXT NOT NULL,
+    genre_key TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS books_title ON books (title_key);
+CREATE INDEX IF NOT EXISTS books_author ON books (author_key);
+CREATE INDEX IF NOT EXISTS books_genre ON books (genre_key, available);
+CREATE INDEX IF NOT EXISTS books_available ON books (available);
+CREATE TABLE IF NOT EXISTS borrowers (
+    borrower_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS loans (
+    book_id TEXT PRIMARY KEY REFERENCES books (book_id),
+    borrower_id TEXT NOT NULL REFERENCES borrowers (borrower_id),
+    checkout_date TEXT
+);
+CREATE INDEX IF NOT EXISTS loans_borrower ON loans (borrower_id);
+"""
+
+_BOOK_COLUMNS = "book_id, title, author, genre, available"
+_SQL_OPERATORS = {"eq": "=", "ne": "!=", "lt": "<", "lte": "<=", "gt": ">", "gte": ">="}
+
+
+class _SQLiteBooks(Mapping):
+    def __init__(self, library: "SQLiteLibrary"):
+        self._library = library
+
+    def __getitem__(self, book_id: str) -> Book:
+        row = self._library._conn.execute(
+            f"SELECT {_BOOK_COLUMNS} FROM books WHERE book_id = ?", (book_id,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(book_id)
+        return _book_from_row(row)
+
+    def __contains__(self, book_id) -> bool:
+        return self._library._conn.execute(
+            "SELECT 1 FROM books WHERE book_id = ?", (book_id,)
+        ).fetchone() is not None
+
+    def __iter__(self):
+        for (book_id,) in self._library._conn.execute("SELECT book_id FROM books ORDER BY rowid"):
+            yield book_id
+
+    def __len__(self) -> int:
+        return self._library._conn.execute("SELECT COUNT(*) FROM books").fetchone()[0]
+
+    def values(self):
+        for row in self._library._conn.execute(f"SELECT {_BOOK_COLUMNS} FROM books ORDER BY rowid"):
+            yield _book_from_row(row)
+
+
+class _SQLiteBorrowers(Mapping):
+    def __init__(self, library: "SQLiteLibrary"):
+        self._library = library
+
+    def __getitem__(self, borrower_id: str) -> Borrower:
+        conn = self._library._conn
+        row = conn.execute(
+            "SELECT borrower_id, name, email FROM borrowers WHERE borrower_id = ?", (borrower_id,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(borrower_id)
+        loans = conn.execute(
+            "SELECT book_id, checkout_date FROM loans WHERE borrower_id = ? ORDER BY rowid", (borrower_id,)
+        ).fetchall()
+        return Borrower(*row, [book_id for book_id, _ in loans], dict(loans))
+
+    def __contains__(self, borrower_id) -> bool:
+        return self._library._conn.execute(
+            "SELECT 1 FROM borrowers WHERE borrower_id = ?", (borrower_id,)
+        ).fetchone() is not None
+
+    def __iter__(self):
+        for (borrower_id,) in self._library._conn.execute("SELECT borrower_id FROM borrowers ORDER BY rowid"):
+            yield borrower_id
+
+    def __len__(self) -> int:
+        return self._library._conn.execute("SELECT COUNT(*) FROM borrowers").fetchone()[0]
+
+
+def _book_from_row(row) -> Book:
+    book_id, title, author, genre, available = row
+    return Book(book_id, title, author, genre, bool(available))
+
+
+class SQLiteLibrary:
+    def __init__(self, name: str, data_dir: str = "."):
+        self.name = name
+        self.db_file = os.path.join(data_dir, "library.db")
+        self._conn = sqlite3.connect(self.db_file, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SQLITE_SCHEMA)
+        loan_columns = [column[1] for column in self._conn.execute("PRAGMA table_info(loans)")]
+        if "checkout_date" not in loan_columns:
+            self._conn.execute("ALTER TABLE loans ADD COLUMN checkout_date TEXT")
+        self.books = _SQLiteBooks(self)
+        self.borrowers = _SQLiteBorrowers(self)
+        self.load()
+
+    def load(self) -> None:
+        self._book_ids = IdAllocator("BOOK", self._max_id("books", "book_id", "BOOK"))
+        self._borrower_ids = IdAllocator("USER", self._max_id("borrowers", "borrower_id", "USER"))
+
+    def save(self) -> None:
+        pass  # every operation commits its own transaction
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self) -> "SQLiteLibrary":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _max_id(self, table: str, column: str, prefix: str) -> list:
+        # IDs are zero-padded to at least four digits, so the longest and
+        # then lexically largest ID carries the highest number.
+        row = self._conn.execute(
+            f"SELECT {column} FROM {table} WHERE {column} LIKE ? ESCAPE '\\' "
+            f"ORDER BY length({column}) DESC, {column} DESC LIMIT 1",
+            (prefix + "\\_%",)
+        ).fetchone()
+        return [row[0]] if row else []
+
+    def _insert_book(self, book: Book) -> None:
+        self._conn.execute(
+            "INSERT INTO books VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (book.book_id, book.title, book.author, book.genre, int(book.available),
+             _index_key(book.title), _index_key(book.author), _index_key(book.genre))
+        )
+        self._book_ids.observe(book.book_id)
+
+    def _insert_borrower(self, borrower: Borrower) -> None:
+        self._conn.execute(
+            "INSERT INTO borrowers VALUES (?, ?, ?)",
+            (borrower.borrower_id, borrower.name, borrower.email)
+        )
+        self._borrower_ids.observe(borrower.borrower_id)
+
+    def add_book(self, title: str, author: str, genre: str) -> Book:
+        book = Book(self._book_ids.peek(), title, author, genre)
+        self._insert_book(book)
+        return book
+
+    def add_borrower(self, name: str, email: str) -> Borrower:
+        borrower = Borrower(self._borrower_ids.peek(), name, email)
+        self._insert_borrower(borrower)
+        return borrower
+
+    def add_books_bulk(self, records) -> dict:
+        def add(title, author, genre):
+            self._insert_book(Book(self._book_ids.peek(), title, author, genre))
+        return self._ingest(records, ("title", "author", "genre"), add)
+
+    def add_borrowers_bulk(self, records) -> dict:
+        def add(name, email):
+            self._insert_borrower(Borrower(self._borrower_ids.peek(), name, email))
+        return self._ingest(records, ("name", "email"), add)
+
+    def _ingest(self, records, fields: tuple, add) -> dict:
+        self._conn.execute("BEGIN")
+        try:
+            report = _ingest_records(records, fields, add, lambda: None)
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            self.load()
+            raise
+        self._conn.execute("COMMIT")
+        return report
+
+    def checkout_book(self, book_id: str, borrower_id: str) -> bool:
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            loans = conn.execute(
+                "SELECT (SELECT COUNT(*) FROM borrowers WHERE borrower_id = ?), "
+                "(SELECT COUNT(*) FROM loans WHERE borrower_id = ?)",
+                (borrower_id, borrower_id)
+            ).fetchone()
+            if not loans[0] or loans[1] >= Borrower.MAX_BOOKS:
+                conn.execute("ROLLBACK")
+                return False
+            updated = conn.execute(
+                "UPDATE books SET available = 0 WHERE book_id = ? AND available = 1", (book_id,)
+            ).rowcount
+            if not updated:
+                conn.execute("ROLLBACK")
+                return False
+            conn.execute("INSERT INTO loans VALUES (?, ?, ?)", (book_id, borrower_id, format_date()))
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return True
+
+    def return_book(self, book_id: str, borrower_id: str) -> bool:
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            deleted = conn.execute(
+                "DELETE FROM loans WHERE book_id = ? AND borrower_id = ?", (book_id, borrower_id)
+            ).rowcount
+            if not deleted:
+                conn.execute("ROLLBACK")
+                return False
+            conn.execute("UPDATE books SET available = 1 WHERE book_id = ?", (book_id,))
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return True
+
+    def _where(self, criteria: dict):
+        # Translates criteria into SQL. Returns None when a criterion has no
+        # SQL equivalent; search_books then filters rows in Python instead.
+        clauses = []
+        params = []
+        for key, value in criteria.items():
+            field, op = _split_criterion(key)
+            values = list(value) if op in ("in", "not_in") else [value]
+            if field in ("title", "author", "genre"):
+                if not all(isinstance(v, str) for v in values):
+                    return None
+                column = f"{field}_key"
+                values = [_index_key(v) for v in values]
+            elif field == "book_id":
+                if not all(isinstance(v, str) for v in values):
+                    return None
+                column = "lower(book_id)"
+                values = [v.lower() for v in values]
+            elif field == "available":
+                if not all(isinstance(v, int) for v in values):
+                    return None
+                column = "available"
+                values = [int(v) for v in values]
+            else:
+                return None
+            if op in ("in", "not_in"):
+                negate = "NOT " if op == "not_in" else ""
+                clauses.append(f"{column} {negate}IN ({', '.join('?' * len(values))})")
+            else:
+                clauses.append(f"{column} {_SQL_OPERATORS[op]} ?")
+            params.extend(values)
+        return " AND ".join(clauses) or "1", params
+
+    def search_books(self, query: Query = None, /, **criteria) -> list:
+        query = _as_query(query, criteria)
+        where = self._where(query.criteria)
+        if where is None:
+            return search_items([b.to_dict() for b in self.books.values()], query)
+        sql, params = where
+        rows = self._conn.execute(
+            f"SELECT {_BOOK_COLUMNS} FROM books WHERE {sql} ORDER BY rowid", params
+        )
+        return [_book_from_row(row).to_dict() for row in rows]
+
+    def get_available_books(self) -> list:
+        rows = self._conn.execute(f"SELECT {_BOOK_COLUMNS} FROM books WHERE available = 1 ORDER BY rowid")
+        return [_book_from_row(row) for row in rows]
+
+    def get_borrower_books(self, borrower_id: str) -> list:
+        rows = self._conn.execute(
+            "SELECT b.book_id, b.title, b.author, b.genre, b.available "
+            "FROM loans l JOIN books b ON b.book_id = l.book_id "
+            "WHERE l.borrower_id = ? ORDER BY l.rowid",
+            (borrower_id,)
+        )
+        return [_book_from_row(row) for row in rows]
+
+    def get_holder(self, book_id: str):
+        row = self._conn.execute("SELECT borrower_id FROM loans WHERE book_id = ?", (book_id,)).fetchone()
+        return self.borrowers[row[0]] if row else None
+
+    def get_overdue_report(self, days: int = 14, today: datetime = None) -> list:
+        today = today or datetime.now()
+        cutoff = format_date(today - timedelta(days=days))
+        rows = self._conn.execute(
+            "SELECT l.book_id, b.title, br.borrower_id, br.name, br.email, l.checkout_date "
+            "FROM loans l JOIN books b ON b.book_id = l.book_id "
+            "JOIN borrowers br ON br.borrower_id = l.borrower_id "
+            "WHERE l.checkout_date < ?",
+            (cutoff,)
+        )
+        report = [
+            _overdue_entry(book_id, title, Borrower(borrower_id, name, email), checkout_date, today)
+            for book_id, title, borrower_id, name, email, checkout_date in rows
+        ]
+        report.sort(key=lambda entry: entry["days_out"], reverse=True)
+        return report
+
+    def get_statistics(self) -> dict:
+        conn = self._conn
+        total_books, available_books = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(available), 0) FROM books"
+        ).fetchone()
+        books_by_genre = {genre: 0 for genre in Book.GENRES}
+        for genre, count in conn.execute("SELECT genre, COUNT(*) FROM books GROUP BY genre"):
+            books_by_genre[genre] = count
+        return {
+            "total_books": total_books,
+            "available_books": available_books,
+            "checked_out": total_books - available_books,
+            "total_borrowers": len(self.borrowers),
+            "books_by_genre": books_by_genre
+        }
+
+
+def open_library(name: str, data_dir: str = ".", engine: str = "memory", **options):
+    if engine == "memory":
+        return Library(name, data_dir, **options)
+    if engine == "sqlite":
+        return SQLiteLibrary(name, data_dir, **options)
+    raise ValueError(f"Invalid storage engine: {engine}")
+
+
+# =============================================================================
+# PART 6: ASYNCIO FRONT END
+# =============================================================================
+
+class AsyncLibrary:
+    def __init__(self, name: str, data_dir: str = ".", flush_delay: float = 0.05, **options):
+        self.library = Library(name, data_dir, thread_safe=True, autosave=False, **options)
+        self.flush_delay = flush_delay
+        self.flushes = 0
+        # Created here, not in start(), so mutations made before start() (or
+        # without it) are still marked dirty and written by flush()/aclose()
+        self._dirty = asyncio.Event()
+        self._writer = None
+        self._inflight = None
+
+    async def start(self) -> None:
+        self._writer = asyncio.create_task(self._write_loop())
+
+    async def aclose(self) -> None:
+        if self._writer is not None:
+            self._writer.cancel()
+            try:
+                await self._writer
+            except asyncio.CancelledError:
+                pass
+            self._writer = None
+        await self.flush()
+
+    async def __aenter__(self) -> "AsyncLibrary":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def flush(self) -> None:
+        # The save runs in a worker thread and is shielded, so cancelling the
+        # writer task never abandons a half-finished flush. A save started by
+        # another caller is waited for but its error is not re-raised here:
+        # a failed save marks the library dirty again, so this call retries.
+        if self._inflight is not None:
+            await asyncio.wait([self._inflight])
+        if self._dirty.is_set():
+            self._dirty.clear()
+            self._inflight = asyncio.get_running_loop().run_in_executor(None, self.library.flush)
+            self._inflight.add_done_callback(self._flushed)
+            await asyncio.shield(self._inflight)
+
+    def _flushed(self, future) -> None:
+        if self._inflight is future:
+            self._inflight = None
+        if not future.cancelled() and future.exception() is None:
+            self.flushes += 1
+        else:
+            self._dirty.set()
+
+    async def _write_loop(self) -> None:
+        # Mutations only set the dirty flag; the writer waits flush_delay so
+        # a burst of mutations is coalesced into a single save(). A failed
+        # save is logged and retried after the next delay.
+        while True:
+            await self._dirty.wait()
+            await asyncio.sleep(self.flush_delay)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("AsyncLibrary save failed; retrying")
+
+    def _changed(self, result):
+        if result is not False:
+            self._dirty.set()
+        return result
+
+    async def add_book(self, title: str, author: str, genre: str) -> Book:
+        return self._changed(self.library.add_book(title, author, genre))
+
+    async def add_borrower(self, name: str, email: str) -> Borrower:
+        return self._changed(self.library.add_borrower(name, email))
+
+    async def checkout_book(self, book_id: str, borrower_id: str) -> bool:
+        return self._changed(self.library.checkout_book(book_id, borrower_id))
+
+    async def return_book(self, book_id: str, borrower_id: str) -> bool:
+        return self._changed(self.library.return_book(book_id, borrower_id))
+
+    async def search_books(self, query: Query = None, /, **criteria) -> list:
+        return self.library.search_books(query, **criteria)
+
+    async def get_available_books(self) -> list:
+        return self.library.get_available_books()
+
+    async def get_statistics(self) -> dict:
+        return self.library.get_statistics()
+
+
+# =============================================================================
+# PART 7: SHARDED LIBRARY
+# =============================================================================
+
+def _id_number(item_id: str) -> int:
+    return int(item_id.partition("_")[2])
+
+
+class _Shard:
+    # Runs inside a shard worker process. A shard is a Library over its own
+    # data directory plus the two-phase commit participant state: IDs locked
+    # by prepared transactions. Locking is no-wait: an operation that touches
+    # a locked book or borrower fails instead of blocking the shard.
+    def __init__(self, library: Library):
+        self.library = library
+        self._prepared = {}
+        self._locked = set()
+
+    def high_water(self) -> tuple:
+        return self.library._book_ids.high_water, self.library._borrower_ids.high_water
+
+    def add_book(self, book_id: str, title: str, author: str, genre: str) -> Book:
+        return self.library._add_book(book_id, title, author, genre)
+
+    def add_borrower(self, borrower_id: str, name: str, email: str) -> Borrower:
+        return self.library._add_borrower(borrower_id, name, email)
+
+    def checkout_book(self, book_id: str, borrower_id: str) -> bool:
+        if book_id in self._locked or borrower_id in self._locked:
+            return False
+        return self.library.checkout_book(book_id, borrower_id)
+
+    def return_book(self, book_id: str, borrower_id: str) -> bool:
+        if book_id in self._locked or borrower_id in self._locked:
+            return False
+        return self.library.return_book(book_id, borrower_id)
+
+    def prepare(self, tx: str, role: str, op: str, book_id: str, borrower_id: str) -> bool:
+        item_id = book_id if role == "book" else borrower_id
+        if item_id in self._locked:
+            return False
+        if role == "book":
+            book = self.library.books.get(book_id)
+            vote = book is not None and book.available == (op == "checkout")
+        else:
+            borrower = self.library.borrowers.get(borrower_id)
+            if borrower is None:
+                vote = False
+            elif op == "checkout":
+                vote = borrower.can_borrow() and not borrower.has_book(book_id)
+            else:
+                vote = borrower.has_book(book_id)
+        if vote:
+            self._prepared[tx] = item_id
+            self._locked.add(item_id)
+        return vote
+
+    def commit(self, tx: str, role: str, decision: dict) -> None:
+        # Also called for transactions this process never prepared (redo
+        # after a coordinator crash); _apply makes that idempotent. The item
+        # stays locked until release(), after the coordinator logs "done", so
+        # no later transaction on it can commit before the decision is
+        # retired and a redo never undoes newer work.
+        lib = self.library
+        if role == "book":
+            op = "lend" if decision["op"] == "checkout" else "unlend"
+        else:
+            op = "borrow" if decision["op"] == "checkout" else "unborrow"
+        entry = {"op": op, "book_id": decision["book_id"], "borrower_id": decision["borrower_id"]}
+        if op == "borrow":
+            entry["date"] = decision["date"]
+        with lib._state_lock:
+            lib._apply(entry)
+            lib._log(entry)
+        # The coordinator logs "done" once this returns, so this half must be
+        # on disk now, whatever the flush policy; journal mode already is
+        if lib.journal:
+            lib._persist()
+        else:
+            lib._save_changes()
+
+    def abort(self, tx: str) -> None:
+        self.release(tx)
+
+    def release(self, tx: str) -> None:
+        item_id = self._prepared.pop(tx, None)
+        self._locked.discard(item_id)
+
+    def get_book(self, book_id: str):
+        return self.library.books.get(book_id)
+
+    def get_borrower(self, borrower_id: str):
+        return self.library.borrowers.get(borrower_id)
+
+    def get_books(self, book_ids: list) -> list:
+        return [self.library.books[bid] for bid in book_ids if bid in self.library.books]
+
+    def get_holder(self, book_id: str):
+        return self.library.get_holder(book_id)
+
+    def search_books(self, criteria: dict) -> list:
+        return self.library.search_books(**criteria)
+
+    def get_available_books(self) -> list:
+        return self.library.get_available_books()
+
+    def get_statistics(self) -> dict:
+        return self.library.get_statistics()
+
+    def save(self) -> None:
+        self.library.save()
+
+
+def _serve_shard(conn, name: str, data_dir: str, options: dict) -> None:
+    try:
+        shard = _Shard(Library(name, data_dir, **options))
+    except Exception as e:
+        conn.send((False, e))
+        return
+    conn.send((True, shard.high_water()))
+    while True:
+        try:
+            method, args = conn.recv()
+        except EOFError:
+            break
+        if method == "close":
+            try:
+                shard.library.close()
+            except Exception as e:
+                conn.send((False, e))
+            else:
+                conn.send((True, None))
+            break
+        try:
+            conn.send((True, getattr(shard, method)(*args)))
+        except Exception as e:
+            conn.send((False, e))
+
+
+class ShardedLibrary:
+    # Books and borrowers are partitioned over worker processes by a CRC32
+    # hash of their ID; each shard persists under data_dir/shard-NN. IDs are
+    # allocated here, in the coordinator, so they stay unique across shards.
+    #
+    # A loan whose book and borrower live on different shards is a two-phase
+    # commit with presumed abort: both shards prepare (validate and lock),
+    # the coordinator durably appends the commit decision to its
+    # transaction log, then both shards apply their half. Decisions without
+    # a "done" record are redone on the next start; the shards keep the
+    # items locked until "done" is logged.
+    def __init__(self, name: str, data_dir: str = ".", shards: int = 4, **options):
+        self.name = name
+        self.data_dir = data_dir
+        self.durable = options.get("durable", True)
+        self.txlog_file = os.path.join(data_dir, "sharded_txlog.jsonl")
+        self._book_ids = IdAllocator("BOOK")
+        self._borrower_ids = IdAllocator("USER")
+        self._ids_lock = threading.Lock()
+        self._tx_ids = count(1)
+        self._conns = []
+        self._locks = []
+        self._processes = []
+        for i in range(shards):
+            shard_dir = os.path.join(data_dir, f"shard-{i:02d}")
+            os.makedirs(shard_dir, exist_ok=True)
+            conn, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_serve_shard, args=(child, name, shard_dir, options), daemon=True)
+            process.start()
+            self._conns.append(conn)
+            self._locks.append(threading.Lock())
+            self._processes.append(process)
+        for conn in self._conns:
+            ok, result = conn.recv()
+            if not ok:
+                self.close()
+                raise result
+            self._book_ids.high_water = max(self._book_ids.high_water, result[0])
+            self._borrower_ids.high_water = max(self._borrower_ids.high_water, result[1])
+        self._recover()
+
+    def __enter__(self) -> "ShardedLibrary":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        for conn, lock, process in zip(self._conns, self._locks, self._processes):
+            with lock:
+                if process.is_alive():
+                    conn.send(("close", ()))
+                    conn.recv()
+                conn.close()
+            process.join()
+        self._conns = []
+        self._processes = []
+
+    def _shard_of(self, item_id: str) -> int:
+        return zlib.crc32(item_id.encode("utf-8")) % len(self._conns)
+
+    def _request(self, calls: list) -> list:
+        # Send every request before reading any reply, so the shards work in
+        # parallel. Shard locks are taken in index order to avoid deadlock.
+        shards = sorted({shard for shard, _, _ in calls})
+        for shard in shards:
+            self._locks[shard].acquire()
+        try:
+            for shard, method, args in calls:
+                self._conns[shard].send((method, args))
+            replies = [self._conns[shard].recv() for shard, _, _ in calls]
+        finally:
+            for shard in shards:
+                self._locks[shard].release()
+        for ok, result in replies:
+            if not ok:
+                raise result
+        return [result for _, result in replies]
+
+    def _call(self, shard: int, method: str, *args):
+        return self._request([(shard, method, args)])[0]
+
+    def _scatter(self, method: str, *args) -> list:
+        return self._request([(shard, method, args) for shard in range(len(self._conns))])
+
+    # -------------------------------------------------------------------------
+    # Two-phase commit
+    # -------------------------------------------------------------------------
+
+    def _log_decision(self, record: dict) -> None:
+        with open(self.txlog_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            if self.durable:
+                os.fsync(f.fileno())
+
+    def _recover(self) -> None:
+        decisions = {}
+        try:
+            with open(self.txlog_file, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        break  # torn write: that decision was never acted on
+                    if record.get("done"):
+                        decisions.pop(record["tx"], None)
+                    else:
+                        decisions[record["tx"]] = record
+        except FileNotFoundError:
+            return
+        for tx, decision in decisions.items():
+            self._commit(tx, decision)
+        os.remove(self.txlog_file)
+
+    def _commit(self, tx: str, decision: dict) -> None:
+        self._request([
+            (self._shard_of(decision["book_id"]), "commit", (tx, "book", decision)),
+            (self._shard_of(decision["borrower_id"]), "commit", (tx, "borrower", decision))
+        ])
+
+    def _release(self, tx: str, decision: dict) -> None:
+        self._request([
+            (self._shard_of(decision["book_id"]), "release", (tx,)),
+            (self._shard_of(decision["borrower_id"]), "release", (tx,))
+        ])
+
+    def _two_phase(self, op: str, book_id: str, borrower_id: str) -> bool:
+        tx = f"{os.getpid()}-{next(self._tx_ids)}"
+        book_shard = self._shard_of(book_id)
+        borrower_shard = self._shard_of(borrower_id)
+        votes = self._request([
+            (book_shard, "prepare", (tx, "book", op, book_id, borrower_id)),
+            (borrower_shard, "prepare", (tx, "borrower", op, book_id, borrower_id))
+        ])
+        if not all(votes):
+            self._request([(book_shard, "abort", (tx,)), (borrower_shard, "abort", (tx,))])
+            return False
+        decision = {"tx": tx, "op": op, "book_id": book_id, "borrower_id": borrower_id, "date": format_date()}
+        self._log_decision(decision)
+        self._commit(tx, decision)
+        self._log_decision({"tx": tx, "done": True})
+        self._release(tx, decision)
+        return True
+
+    # -------------------------------------------------------------------------
+    # Public API
+    # -------------------------------------------------------------------------
+
+    def add_book(self, title: str, author: str, genre: str) -> Book:
+        with self._ids_lock:
+            book_id = self._book_ids.peek()
+            book = self._call(self._shard_of(book_id), "add_book", book_id, title, author, genre)
+            self._book_ids.observe(book_id)
+        return book
+
+    def add_borrower(self, name: str, email: str) -> Borrower:
+        with self._ids_lock:
+            borrower_id = self._borrower_ids.peek()
+            borrower = self._call(self._shard_of(borrower_id), "add_borrower", borrower_id, name, email)
+            self._borrower_ids.observe(borrower_id)
+        return borrower
+
+    def checkout_book(self, book_id: str, borrower_id: str) -> bool:
+        shard = self._shard_of(book_id)
+        if shard == self._shard_of(borrower_id):
+            return self._call(shard, "checkout_book", book_id, borrower_id)
+        return self._two_phase("checkout", book_id, borrower_id)
+
+    def return_book(self, book_id: str, borrower_id: str) -> bool:
+        shard = self._shard_of(book_id)
+        if shard == self._shard_of(borrower_id):
+            return self._call(shard, "return_book", book_id, borrower_id)
+        return self._two_phase("return", book_id, borrower_id)
+
+    def get_book(self, book_id: str):
+        return self._call(self._shard_of(book_id), "get_book", book_id)
+
+    def get_borrower(self, borrower_id: str):
+        return self._call(self._shard_of(borrower_id), "get_borrower", borrower_id)
+
+    def get_borrower_books(self, borrower_id: str) -> list:
+        borrower = self.get_borrower(borrower_id)
+        if borrower is None:
+            return []
+        by_shard = {}
+        for book_id in borrower.borrowed_books:
+            by_shard.setdefault(self._shard_of(book_id), []).append(book_id)
+        books = {}
+        for found in self._request([(shard, "get_books", (ids,)) for shard, ids in by_shard.items()]):
+            books.update((book.book_id, book) for book in found)
+        return [books[bid] for bid in borrower.borrowed_books if bid in books]
+
+    def get_holder(self, book_id: str):
+        for holder in self._scatter("get_holder", book_id):
+            if holder is not None:
+                return holder
+        return None
+
+    def search_books(self, query: Query = None, /, **criteria) -> list:
+        query = _as_query(query, criteria)
+        results = [book for found in self._scatter("search_books", query.criteria) for book in found]
+        results.sort(key=lambda book: _id_number(book["book_id"]))
+        return results
+
+    def get_available_books(self) -> list:
+        books = [book for found in self._scatter("get_available_books") for book in found]
+        books.sort(key=lambda book: _id_number(book.book_id))
+        return books
+
+    def get_statistics(self) -> dict:
+        merged = {"total_books": 0, "available_books": 0, "checked_out": 0, "total_borrowers": 0,
+                  "books_by_genre": {genre: 0 for genre in Book.GENRES}}
+        for stats in self._scatter("get_statistics"):
+            for key in ("total_books", "available_books", "checked_out", "total_borrowers"):
+                merged[key] += stats[key]
+            for genre, count in stats["books_by_genre"].items():
+                merged["books_by_genre"][genre] = merged["books_by_genre"].get(genre, 0) + count
+        return merged
+
+    def save(self) -> None:
+        self._scatter("save")
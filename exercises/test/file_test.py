@@ -51,6 +51,164 @@ class TestFileOperations:
         count = count_words("test_words.txt")
         assert count == 6, f"count_words failed: expected 6, got {count}"
 
+    def test_appender_buffers_until_flush(self):
+        """Test Appender holds lines until a flush or close"""
+        with Appender("test_append.txt") as log:
+            log.append("First")
+            log.append("Second")
+            assert read_lines("test_append.txt") == []
+            log.flush()
+            assert read_lines("test_append.txt") == ["First", "Second"]
+            log.append("Third")
+        assert read_lines("test_append.txt") == ["First", "Second", "Third"]
+        with pytest.raises(ValueError):
+            log.append("Fourth")
+
+    def test_appender_thresholds(self):
+        """Test Appender flushes on line count, size and elapsed time"""
+        import time
+        with Appender("test_append.txt", max_lines=3, durable=True) as log:
+            for i in range(4):
+                log.append(f"line {i}")
+            assert len(read_lines("test_append.txt")) == 3
+        with Appender("test_append.txt", max_bytes=12) as log:
+            log.append("abcdef")
+            log.append("ghijkl")
+            assert len(read_lines("test_append.txt")) == 6
+        with Appender("test_append.txt", max_bytes=12) as log:
+            log.append("éééééé")
+            assert read_lines("test_append.txt")[-1] == "éééééé"
+        with Appender("test_append.txt", flush_interval=20) as log:
+            log.append("idle")
+            deadline = time.monotonic() + 2
+            while read_lines("test_append.txt")[-1] != "idle" and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert read_lines("test_append.txt")[-1] == "idle"
+
+    def test_appender_flushes_when_collected(self):
+        """Test an Appender dropped without close() still writes its lines"""
+        import gc
+        def log_once():
+            log = Appender("test_append.txt")
+            log.append("abandoned")
+        log_once()
+        gc.collect()
+        assert read_lines("test_append.txt") == ["abandoned"]
+
+    def test_appender_flushes_at_exit(self, tmp_path):
+        """Test lines buffered by an unclosed Appender are written at exit"""
+        import subprocess
+        import sys
+        path = tmp_path / "exit.txt"
+        script = ("from exercises.src.files import Appender\n"
+                  f"log = Appender({str(path)!r})\n"
+                  "log.append('before exit')\n")
+        subprocess.run([sys.executable, "-c", script], check=True,
+                       cwd=os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+        assert read_lines(str(path)) == ["before exit"]
+
+    def test_appender_threads_keep_lines_whole(self):
+        """Test concurrent appends never lose or interleave lines"""
+        from concurrent.futures import ThreadPoolExecutor
+        with Appender("test_append.txt", max_lines=7) as log:
+            def write(t):
+                for i in range(200):
+                    log.append(f"thread {t} line {i} " + "x" * 50)
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                list(pool.map(write, range(8)))
+        lines = read_lines("test_append.txt")
+        assert sorted(lines) == sorted(f"thread {t} line {i} " + "x" * 50 for t in range(8) for i in range(200))
+
+    @pytest.mark.slow
+    def test_appender_benchmark(self):
+        """Benchmark Appender against per-call append_line"""
+        import time
+        n = 5000
+        started = time.perf_counter()
+        for i in range(n):
+            append_line("test_append.txt", f"audit event {i}")
+        per_call = time.perf_counter() - started
+        started = time.perf_counter()
+        with Appender("test_append.txt") as log:
+            for i in range(n):
+                log.append(f"audit event {i}")
+        buffered = time.perf_counter() - started
+        print(f"\nappend_line: {n / per_call:.0f} lines/s, Appender: {n / buffered:.0f} lines/s")
+        assert len(read_lines("test_append.txt")) == 2 * n
+
+    def test_iter_lines_streams(self):
+        """Test iter_lines is a generator over stripped lines"""
+        write_lines("test_output.txt", (f"Line {i}" for i in range(3)), batch_size=2)
+        lines = iter_lines("test_output.txt")
+        assert next(lines) == "Line 0"
+        assert list(lines) == ["Line 1", "Line 2"]
+
+    def test_count_words_across_chunks(self):
+        """Test chunked count_words counts words split at chunk boundaries once"""
+        write_lines("test_words.txt", ["Hello World", "  This is\tPython programming  ", "", "x"])
+        for chunk_size in (1, 2, 3, 5, 7, 64):
+            assert count_words("test_words.txt", chunk_size=chunk_size) == 7
+
+    @pytest.mark.slow
+    def test_streaming_memory_benchmark(self, tmp_path):
+        """Benchmark peak memory of the streaming helpers on a large file"""
+        import tracemalloc
+        path = str(tmp_path / "big.log")
+        tracemalloc.start()
+        write_lines(path, (f"{i} GET /index.html 200 user{i % 97}" for i in range(200000)))
+        write_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.reset_peak()
+        words = count_words(path, chunk_size=1 << 16)
+        count_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.reset_peak()
+        lines = sum(1 for _ in iter_lines(path))
+        iter_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        size = os.path.getsize(path)
+        print(f"\nfile={size >> 20}MB peaks: write={write_peak >> 10}KB count={count_peak >> 10}KB iter={iter_peak >> 10}KB")
+        assert words == 200000 * 5 and lines == 200000
+        assert max(write_peak, count_peak, iter_peak) < size / 8
+
+    def test_count_words_long_token(self):
+        """Test a word spanning many chunks is counted once in both modes"""
+        write_lines("test_words.txt", ["a " + "x" * 10000 + " b"])
+        assert count_words("test_words.txt", chunk_size=64) == 3
+        assert count_words("test_words.txt", chunk_size=64, frequencies=True) == {"a": 1, "x" * 10000: 1, "b": 1}
+
+    def test_count_words_frequencies(self):
+        """Test count_words can return a Counter of words across chunks"""
+        write_lines("test_words.txt", ["the cat", "the hat", "thethe"])
+        assert count_words("test_words.txt", chunk_size=3, frequencies=True) == {
+            "the": 2, "cat": 1, "hat": 1, "thethe": 1}
+
+    def test_count_words_parallel_matches(self, tmp_path):
+        """Test the parallel count matches count_words exactly"""
+        path = str(tmp_path / "words.txt")
+        lines = [f"café\u00a0naïve {i}\tword{i % 7}  " * (i % 4) for i in range(300)]
+        write_lines(path, lines)
+        text = open(path, encoding="utf-8").read()
+        for workers in (1, 3, 8):
+            assert count_words_parallel(path, workers=workers, chunk_size=64) == count_words(path) == len(text.split())
+        assert count_words_parallel(path, workers=3, chunk_size=50, frequencies=True) == Counter(text.split())
+
+    def test_count_words_parallel_empty(self, tmp_path):
+        """Test the parallel count of an empty file"""
+        path = tmp_path / "empty.txt"
+        path.write_text("")
+        assert count_words_parallel(str(path), workers=2) == 0
+
+    @pytest.mark.slow
+    def test_count_words_parallel_benchmark(self, tmp_path):
+        """Benchmark parallel word counting as workers are added"""
+        import time
+        path = str(tmp_path / "big.log")
+        write_lines(path, (f"{i} GET /index.html 200 user{i % 97}" for i in range(200000)))
+        expected = count_words(path)
+        for workers in (1, 2, 4):
+            started = time.perf_counter()
+            assert count_words_parallel(path, workers=workers) == expected
+            print(f"\n{workers} workers: {time.perf_counter() - started:.3f}s on {os.cpu_count()} CPUs")
+
 
 class TestJSONOperations:
     """Test suite for JSON file operations"""
@@ -77,6 +235,24 @@ class TestJSONOperations:
             loaded = json.load(f)
         assert loaded == test_data, "save_json failed"
 
+    def test_save_json_is_atomic(self):
+        """Test save_json keeps the old file when serialization fails"""
+        save_json("test_data.json", {"name": "Alice"})
+        with pytest.raises(TypeError):
+            save_json("test_data.json", {"name": object()})
+        assert load_json("test_data.json") == {"name": "Alice"}
+        assert not [f for f in os.listdir(".") if f.startswith(".tmp-")]
+
+    def test_save_json_keeps_file_mode(self, tmp_path):
+        """Test save_json keeps an existing file's permissions and uses the umask for new files"""
+        import stat
+        save_json("test_data.json", {"name": "Alice"})
+        (tmp_path / "reference.json").write_text("{}")
+        assert stat.S_IMODE(os.stat("test_data.json").st_mode) == stat.S_IMODE(os.stat(tmp_path / "reference.json").st_mode)
+        os.chmod("test_data.json", 0o640)
+        save_json("test_data.json", {"name": "Bob"})
+        assert stat.S_IMODE(os.stat("test_data.json").st_mode) == 0o640
+
     def test_load_json(self):
         """Test 3.6 - load_json function"""
         test_data = {"name": "Alice", "scores": [85, 90, 88]}
@@ -150,3 +326,114 @@ class TestTodoList:
         todo2 = TodoList("test_todos.json")
         assert len(todo2.get_all()) == 2, "Should load 2 todos from file"
 
+    def test_todo_journal_replay(self, tmp_path):
+        """Test journal mode appends events and replays them on load"""
+        path = str(tmp_path / "todos.json")
+        todo = TodoList(path, journal=True)
+        todo.add("Task 1")
+        id2 = todo.add("Task 2")
+        todo.complete(1)
+        assert not os.path.exists(path)
+        assert len(read_lines(path + ".log")) == 3
+
+        todo2 = TodoList(path, journal=True)
+        assert [t["task"] for t in todo2.get_pending()] == ["Task 2"]
+        assert todo2.add("Task 3") == id2 + 1
+
+    def test_todo_journal_compaction(self, tmp_path):
+        """Test the log is folded into the JSON file every compact_every events"""
+        path = str(tmp_path / "todos.json")
+        todo = TodoList(path, journal=True, compact_every=3)
+        for i in range(4):
+            todo.add(f"Task {i}")
+        todo.complete(2)
+        assert len(load_json(path)) == 3
+        assert len(read_lines(path + ".log")) == 2
+
+        todo2 = TodoList(path, journal=True)
+        assert todo2.get_all() == todo.get_all()
+        assert [t["id"] for t in todo2.get_pending()] == [1, 3, 4]
+
+    def test_todo_journal_ignores_torn_tail(self, tmp_path):
+        """Test a partially written last event is dropped on replay"""
+        path = str(tmp_path / "todos.json")
+        todo = TodoList(path, journal=True)
+        todo.add("Task 1")
+        append_line(path + ".log", '{"op": "add", "id": 2, "ta')
+        assert len(TodoList(path, journal=True).get_all()) == 1
+
+    @pytest.mark.slow
+    def test_todo_journal_benchmark(self, tmp_path):
+        """Benchmark add/complete throughput with full rewrites and with the journal"""
+        import time
+
+        def run(journal, n=1500):
+            todo = TodoList(str(tmp_path / f"{journal}.json"), journal=journal)
+            started = time.perf_counter()
+            for i in range(n):
+                todo.add(f"Task {i}")
+            for i in range(1, n + 1, 2):
+                todo.complete(i)
+            rate = (n + n // 2) / (time.perf_counter() - started)
+            print(f"\njournal={journal}: {rate:.0f} ops/s")
+            assert len(todo.get_pending()) == n // 2
+            return rate
+
+        run(True)
+        run(False, n=150)
+
+    def test_shared_todo_merges_other_writers(self, tmp_path):
+        """Test shared instances re-read and merge each other's changes by id"""
+        path = str(tmp_path / "todos.json")
+        a = TodoList(path, shared=True)
+        b = TodoList(path, shared=True)
+        assert a.add("Task 1") == 1
+        assert b.add("Task 2") == 2
+        assert a.add("Task 3") == 3
+        assert b.complete(1)
+        a.refresh()
+        assert [t["id"] for t in a.get_pending()] == [2, 3]
+        assert len(TodoList(path).get_all()) == 3
+
+    def test_shared_todo_optimistic_version(self, tmp_path):
+        """Test expected_version rejects a write when another process wrote first"""
+        path = str(tmp_path / "todos.json")
+        a = TodoList(path, shared=True)
+        b = TodoList(path, shared=True)
+        a.add("Task 1")
+        b.refresh()
+        seen = b.version
+        a.add("Task 2")
+        with pytest.raises(VersionConflict):
+            b.complete(1, expected_version=seen)
+        b.refresh()
+        assert b.complete(1, expected_version=b.version)
+        assert TodoList(path).get_all()[0]["done"]
+
+    @pytest.mark.slow
+    def test_shared_todo_contention_benchmark(self, tmp_path):
+        """Benchmark shared TodoList throughput as worker processes are added"""
+        import multiprocessing
+        import time
+        ops = 40
+        for workers in (1, 2, 4):
+            path = str(tmp_path / f"todos-{workers}.json")
+            TodoList(path, shared=True)
+            processes = [multiprocessing.Process(target=_todo_worker, args=(path, ops)) for _ in range(workers)]
+            started = time.perf_counter()
+            for p in processes:
+                p.start()
+            for p in processes:
+                p.join()
+            rate = workers * ops * 2 / (time.perf_counter() - started)
+            print(f"\n{workers} workers: {rate:.0f} ops/s")
+            todos = TodoList(path, shared=True)
+            assert all(p.exitcode == 0 for p in processes)
+            assert [t["id"] for t in todos.get_all()] == list(range(1, workers * ops + 1))
+            assert todos.get_pending() == []
+
+
+def _todo_worker(path, ops):
+    todo = TodoList(path, shared=True)
+    for i in range(ops):
+        todo.complete(todo.add(f"Task {os.getpid()}-{i}"))